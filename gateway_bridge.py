@@ -5,23 +5,100 @@ Substitui o cliente.py, recebendo dados via LoRa
 """
 
 import serial
+import argparse
 import json
 import http.client
+import logging
+import math
+import logging.handlers
+import queue
+import select
+import sys
 import time
+from collections import deque
 from datetime import datetime
 
+# orjson é opcional: parse/serialização bem mais rápidos que o json da stdlib
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode()
+
+# urllib3 é opcional: pool de conexões; sem ele usa http.client com keep-alive
+try:
+    import urllib3
+except ImportError:
+    urllib3 = None
+
+# fastjsonschema é opcional: compila a validação dos pacotes
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+logger = logging.getLogger('gateway_bridge')
+
 # ===== CONFIGURAÇÕES =====
 SERIAL_PORT = 'COM5'  # ajustar para porta
 SERIAL_BAUD = 115200
+SERIAL_TIMEOUT = 0.5  # readline bloqueante: acorda com dados ou após este tempo
 
 SERVIDOR_HOST = 'localhost'
 SERVIDOR_PORT = 8000
 
+# Cabeçalhos fixos de todo POST; o Content-Length é calculado pelo cliente HTTP a partir do corpo
+HEADERS_JSON = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+
+MAX_LOTE = 16          # pacotes por POST em rajadas LoRa
+INTERVALO_LOTE = 0.2   # tempo máximo (s) que um pacote espera no buffer
+
+# ===== VALIDAÇÃO =====
+ESQUEMA_PACOTE = {
+    'type': 'object',
+    'required': ['sensor_id', 'temperatura', 'umidade', 'poeira'],
+    'properties': {
+        # "nenhum caractere fora de \x20-\x7e" (ASCII imprimível, igual a isprintable()):
+        # com ^...$ o $ do Python ainda aceitaria um \n no fim
+        'sensor_id': {'type': 'string', 'minLength': 1, 'maxLength': 50,
+                      'not': {'pattern': '[^\\x20-\\x7e]'}},
+        'temperatura': {'type': 'number', 'minimum': 0, 'maximum': 60},
+        'umidade': {'type': 'number', 'minimum': 0, 'maximum': 100},
+        'poeira': {'type': 'number'}
+    }
+}
+
 # ===== ESTATÍSTICAS =====
 pacotes_recebidos = 0
 pacotes_enviados = 0
 erros = 0
 
+# ===== CONEXÃO HTTP =====
+conexao = None  # reaproveitada entre pacotes (keep-alive) quando não há urllib3
+
+# ===== BUFFER DE ENVIO =====
+buffer_envio = deque(maxlen=MAX_LOTE)
+inicio_lote = 0.0  # momento em que o pacote mais antigo do buffer chegou
+
+# ===== TIMESTAMP =====
+ultimo_segundo = None  # pacotes no mesmo segundo reaproveitam a string ISO
+ultimo_timestamp = ''
+
+def timestamp_atual():
+    """Retorna o horário atual em ISO-8601 (precisão de segundos), formatando no máximo uma vez por segundo"""
+    global ultimo_segundo, ultimo_timestamp
+    
+    agora = int(time.time())
+    if agora != ultimo_segundo:
+        ultimo_segundo = agora
+        ultimo_timestamp = datetime.fromtimestamp(agora).isoformat()
+    return ultimo_timestamp
+
 def conectar_serial():
     """Conecta à porta serial do Gateway ESP32"""
     print("🔌 Conectando ao Gateway ESP32...")
@@ -29,7 +106,7 @@ def conectar_serial():
     print(f"   Baud: {SERIAL_BAUD}")
     
     try:
-        ser = serial.Serial(SERIAL_PORT, SERIAL_BAUD, timeout=1)
+        ser = serial.Serial(SERIAL_PORT, SERIAL_BAUD, timeout=SERIAL_TIMEOUT)
         time.sleep(2)  # Aguarda inicialização
         print("✓ Serial conectada!\n")
         return ser
@@ -45,136 +122,246 @@ def conectar_serial():
         print(f"❌ Erro desconhecido: {e}")
         return None
 
-def enviar_para_servidor(dados):
-    """Envia dados via HTTP POST (igual ao cliente.py)"""
-    global pacotes_enviados, erros
+if urllib3 is not None:
+    # Pool de conexões keep-alive: reuso e reconexão ficam com o urllib3 (que já
+    # descarta conexões ociosas derrubadas antes de reusar). Retry só de conexão:
+    # read=False não reenvia um POST que o servidor pode já ter gravado
+    pool = urllib3.PoolManager(num_pools=1, maxsize=4,
+                               retries=urllib3.Retry(total=2, connect=2, read=False,
+                                                     redirect=False, backoff_factor=0.1))
     
-    try:
-        # Conecta ao servidor
-        conn = http.client.HTTPConnection(SERVIDOR_HOST, SERVIDOR_PORT, timeout=5)
+    def fechar_conexao():
+        """Descarta as conexões do pool; a próxima requisição abre outra"""
+        pool.clear()
+    
+    def requisitar_post(caminho, payload, headers):
+        """POST por uma conexão do pool (o urllib3 só repete se a conexão nem abriu)"""
+        try:
+            resposta = pool.request('POST', f'http://{SERVIDOR_HOST}:{SERVIDOR_PORT}{caminho}',
+                                    body=payload, headers=headers, timeout=5)
+        except urllib3.exceptions.MaxRetryError as e:
+            if isinstance(e.reason, urllib3.exceptions.NewConnectionError):
+                raise ConnectionRefusedError(str(e.reason)) from e
+            raise
+        return resposta.status, resposta.data.decode()
+else:
+    def obter_conexao():
+        """Retorna a conexão HTTP persistente (keep-alive), criando se necessário"""
+        global conexao
         
-        # Prepara payload (formato do cliente.py)
-        payload = json.dumps(dados)
+        # Conexão ociosa que o servidor já fechou fica "legível" (EOF): troca antes
+        # de mandar o POST, em vez de descobrir depois que ele se perdeu
+        if conexao is not None and conexao.sock is not None:
+            legivel, _, _ = select.select([conexao.sock], [], [], 0)
+            if legivel:
+                fechar_conexao()
         
-        # Cabeçalhos HTTP
-        headers = {
-            'Content-Type': 'application/json',
-            'Content-Length': len(payload)
-        }
+        if conexao is None:
+            conexao = http.client.HTTPConnection(SERVIDOR_HOST, SERVIDOR_PORT, timeout=5)
+        return conexao
+    
+    def fechar_conexao():
+        """Fecha a conexão persistente; a próxima requisição abre outra"""
+        global conexao
         
-        # Envia POST para /api/sensor (mesmo endpoint do cliente.py)
-        conn.request('POST', '/api/sensor', payload, headers)
+        if conexao is not None:
+            conexao.close()
+            conexao = None
+    
+    def requisitar_post(caminho, payload, headers):
+        """POST na conexão persistente, reenviando só se ele nem chegou a sair"""
+        for tentativa in range(2):
+            conn = obter_conexao()
+            reutilizada = conn.sock is not None
+            try:
+                conn.request('POST', caminho, payload, headers)
+            except (ConnectionResetError, BrokenPipeError):
+                # Falhou no envio numa conexão ociosa que o servidor já fechou: ele
+                # não processou nada, então reenviar não duplica leituras
+                fechar_conexao()
+                if tentativa or not reutilizada:
+                    raise
+                continue
+            
+            try:
+                resposta = conn.getresponse()
+                # Lê o corpo inteiro para a conexão poder ser reutilizada
+                corpo = resposta.read().decode()
+            except Exception:
+                # O servidor pode já ter gravado o lote: POST não é idempotente, não reenvia
+                fechar_conexao()
+                raise
+            return resposta.status, corpo
+
+def enviar_para_servidor(lote):
+    """Envia um lote de pacotes via HTTP POST (um pacote usa o endpoint do cliente.py)"""
+    global pacotes_enviados, erros
+    
+    try:
+        # Prepara payload (formato do cliente.py), já em bytes
+        if len(lote) == 1:
+            caminho = '/api/sensor'
+            payload = json_dumps(lote[0])
+        else:
+            caminho = '/api/sensor/batch'
+            payload = json_dumps(list(lote))
         
-        # Recebe resposta
-        resposta = conn.getresponse()
-        corpo = resposta.read().decode()
+        status, corpo = requisitar_post(caminho, payload, HEADERS_JSON)
         
-        if resposta.status == 200:
-            pacotes_enviados += 1
-            print(f"✓ Enviado ao servidor: {dados['sensor_id']}")
-            print(f"  T:{dados['temperatura']}°C, U:{dados['umidade']}%, P:{dados['poeira']}µg/m³")
-            print(f"  RSSI:{dados.get('rssi', 'N/A')} dBm, SNR:{dados.get('snr', 'N/A')}")
+        if status == 200:
+            # No lote o servidor grava os pacotes bons e devolve o índice dos recusados
+            rejeitadas = set(json_loads(corpo).get('rejeitadas', ())) if len(lote) > 1 else set()
+            if rejeitadas:
+                erros += len(rejeitadas)
+                logger.warning("⚠️  Servidor recusou %d de %d pacotes do lote", len(rejeitadas), len(lote))
+            pacotes_enviados += len(lote) - len(rejeitadas)
+            # Só monta as mensagens se alguém for ler (--quiet desliga)
+            if logger.isEnabledFor(logging.INFO):
+                for indice, dados in enumerate(lote):
+                    if indice in rejeitadas:
+                        continue
+                    logger.info("✓ Enviado ao servidor: %s\n  T:%s°C, U:%s%%, P:%sµg/m³\n  RSSI:%s dBm, SNR:%s",
+                                dados['sensor_id'], dados['temperatura'], dados['umidade'], dados['poeira'],
+                                dados.get('rssi', 'N/A'), dados.get('snr', 'N/A'))
             return True
         else:
             erros += 1
-            print(f"⚠️  Servidor respondeu {resposta.status}: {corpo}")
+            logger.warning("⚠️  Servidor respondeu %s: %s", status, corpo)
             return False
             
     except ConnectionRefusedError:
         erros += 1
-        print(f"❌ Servidor não acessível em {SERVIDOR_HOST}:{SERVIDOR_PORT}")
-        print("   Certifique-se que o servidor.py está rodando!")
+        fechar_conexao()
+        logger.error("❌ Servidor não acessível em %s:%s\n   Certifique-se que o servidor.py está rodando!",
+                     SERVIDOR_HOST, SERVIDOR_PORT)
         return False
     except Exception as e:
         erros += 1
-        print(f"❌ Erro ao enviar: {e}")
+        fechar_conexao()
+        logger.error("❌ Erro ao enviar: %s", e)
         return False
-    finally:
+
+def enfileirar_envio(dados):
+    """Acumula o pacote no buffer e descarrega quando o lote enche ou envelhece"""
+    global inicio_lote
+    
+    if not buffer_envio:
+        inicio_lote = time.monotonic()
+    buffer_envio.append(dados)
+    
+    if len(buffer_envio) >= MAX_LOTE or time.monotonic() - inicio_lote >= INTERVALO_LOTE:
+        descarregar_buffer()
+
+def descarregar_buffer():
+    """Envia ao servidor tudo que estiver pendente no buffer"""
+    if buffer_envio:
+        lote = list(buffer_envio)
+        buffer_envio.clear()
+        enviar_para_servidor(lote)
+
+CAMPOS_NUMERICOS = ('temperatura', 'umidade', 'poeira')
+
+def valores_finitos(dados):
+    """Recusa NaN/Infinity (o json da stdlib aceita, o orjson não; o esquema não distingue)"""
+    try:
+        if all(math.isfinite(dados[campo]) for campo in CAMPOS_NUMERICOS):
+            return None
+    except OverflowError:  # inteiro grande demais para virar float
+        pass
+    return "Valores numéricos inválidos"
+
+def validar_pacote_manual(dados):
+    """Valida o pacote campo a campo com as mesmas regras de ESQUEMA_PACOTE; retorna o motivo da rejeição ou None"""
+    # Verifica campos obrigatórios (os mesmos de 'required' no esquema)
+    if not isinstance(dados, dict) or any(campo not in dados for campo in ESQUEMA_PACOTE['required']):
+        return "Pacote incompleto"
+    
+    # Verifica se sensor_id é string ASCII imprimível (mesma regra do servidor.py:
+    # byte de controle de pacote corrompido seria recusado lá de qualquer jeito)
+    sensor_id = dados['sensor_id']
+    if (not isinstance(sensor_id, str) or not sensor_id or len(sensor_id) > 50
+            or not sensor_id.isascii() or not sensor_id.isprintable()):
+        return "sensor_id inválido ou corrompido"
+    
+    # Verifica valores numéricos: só números JSON, como 'type': 'number' no esquema
+    # (string numérica e booleano são recusados nos dois caminhos)
+    for campo in CAMPOS_NUMERICOS:
+        valor = dados[campo]
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+            return "Valores numéricos inválidos"
+    motivo = valores_finitos(dados)
+    if motivo:
+        return motivo
+    
+    temp = dados['temperatura']
+    umid = dados['umidade']
+    # Validação de ranges sensatos
+    if not (0 <= temp <= 60):  # Temperatura entre 0-60°C
+        return f"Temperatura fora do range ({temp}°C)"
+    if not (0 <= umid <= 100):  # Umidade 0-100%
+        return f"Umidade fora do range ({umid}%)"
+    return None
+
+if fastjsonschema is not None:
+    # Mesmas regras de validar_pacote_manual, compiladas uma vez em código Python direto
+    _validar_esquema = fastjsonschema.compile(ESQUEMA_PACOTE)
+    
+    def validar_pacote(dados):
+        """Valida o pacote pelo esquema compilado; retorna o motivo da rejeição ou None"""
         try:
-            conn.close()
-        except:
-            pass
+            _validar_esquema(dados)
+        except fastjsonschema.JsonSchemaException as e:
+            return f"Pacote inválido ({e.message})"
+        # JSON Schema não tem como recusar NaN/Infinity: mesma checagem do caminho manual
+        return valores_finitos(dados)
+else:
+    validar_pacote = validar_pacote_manual
 
 def processar_linha_serial(linha):
-    """Processa linha recebida do Gateway ESP32"""
+    """Processa linha (bytes) recebida do Gateway ESP32"""
     global pacotes_recebidos, erros
     
-    # Protocolo: DATA:{json}
-    if linha.startswith('DATA:'):
+    # Protocolo: DATA:{json} (linha em bytes: JSON é ASCII, dispensa decodificar)
+    if linha.startswith(b'DATA:'):
         try:
-            json_str = linha[5:].strip()
+            json_bytes = linha[5:].strip()
             
-            # Parse JSON
-            dados = json.loads(json_str)
+            # Parse JSON direto dos bytes
+            dados = json_loads(json_bytes)
             
             # ===== VALIDAÇÃO ROBUSTA (filtro anti-corrupção) =====
-            # Verifica campos obrigatórios
-            if 'sensor_id' not in dados or 'temperatura' not in dados:
-                print(f"⚠️  Pacote incompleto, ignorando...")
-                erros += 1
-                return
-            
-            # Verifica se sensor_id é string válida (sem caracteres estranhos)
-            if not isinstance(dados['sensor_id'], str) or len(dados['sensor_id']) > 50:
-                print(f"⚠️  sensor_id inválido, ignorando...")
-                erros += 1
-                return
-            
-            # Verifica se há caracteres não-ASCII no sensor_id
-            try:
-                dados['sensor_id'].encode('ascii')
-            except UnicodeEncodeError:
-                print(f"⚠️  sensor_id corrompido (caracteres inválidos), ignorando...")
-                erros += 1
-                return
-            
-            # Verifica valores numéricos
-            try:
-                temp = float(dados['temperatura'])
-                umid = float(dados['umidade'])
-                poeira = float(dados['poeira'])
-                
-                # Validação de ranges sensatos
-                if not (0 <= temp <= 60):  # Temperatura entre 0-60°C
-                    print(f"⚠️  Temperatura fora do range ({temp}°C), ignorando...")
-                    erros += 1
-                    return
-                    
-                if not (0 <= umid <= 100):  # Umidade 0-100%
-                    print(f"⚠️  Umidade fora do range ({umid}%), ignorando...")
-                    erros += 1
-                    return
-                    
-            except (ValueError, TypeError):
-                print(f"⚠️  Valores numéricos inválidos, ignorando...")
+            motivo = validar_pacote(dados)
+            if motivo:
+                logger.warning("⚠️  %s, ignorando...", motivo)
                 erros += 1
                 return
             
             # ===== PACOTE VÁLIDO! =====
             pacotes_recebidos += 1
             
-            print(f"\n✅ Pacote LoRa VÁLIDO #{pacotes_recebidos}")
+            logger.info("\n✅ Pacote LoRa VÁLIDO #%d", pacotes_recebidos)
             
-            # Adiciona timestamp do servidor (igual ao cliente.py)
-            dados['timestamp_sensor'] = datetime.now().isoformat()
+            # Adiciona timestamp de recepção (igual ao cliente.py); o servidor grava este mesmo valor
+            dados['timestamp_sensor'] = timestamp_atual()
             
-            # Envia para servidor HTTP
-            enviar_para_servidor(dados)
+            # Envia para servidor HTTP (em lote, se vierem vários seguidos)
+            enfileirar_envio(dados)
             
         except json.JSONDecodeError as e:
-            print(f"⚠️  JSON corrompido, ignorando... [{str(e)[:50]}]")
+            logger.warning("⚠️  JSON corrompido, ignorando... [%.50s]", e)
             erros += 1
         except Exception as e:
-            print(f"⚠️  Erro ao processar, ignorando... [{str(e)[:50]}]")
+            logger.warning("⚠️  Erro ao processar, ignorando... [%.50s]", e)
             erros += 1
     
-    # Outras mensagens do Gateway (logs)
-    elif linha.startswith('READY:') or linha.startswith('ERROR:'):
-        print(f"[Gateway] {linha}")
-    elif linha.strip():
-        # Ignora linhas vazias, mostra outras
-        if not linha.startswith('✓') and not linha.startswith('═'):
-            print(f"[Gateway] {linha}")
+    # Outras mensagens do Gateway (logs): só estas são decodificadas
+    else:
+        texto = linha.decode('utf-8', errors='ignore').strip()
+        # Ignora linhas vazias, mostra as demais
+        if texto.startswith('READY:') or texto.startswith('ERROR:'):
+            logger.info("[Gateway] %s", texto)
+        elif texto and not texto.startswith('✓') and not texto.startswith('═'):
+            logger.info("[Gateway] %s", texto)
 
 def exibir_estatisticas():
     """Exibe estatísticas finais"""
@@ -189,8 +376,29 @@ def exibir_estatisticas():
         print(f"Taxa de sucesso:            {taxa_sucesso:.1f}%")
     print("="*60)
 
+def configurar_log(quiet=False):
+    """Log assíncrono: o hot path só enfileira o registro; uma thread escreve no terminal"""
+    fila = queue.Queue(-1)
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(logging.Formatter('%(message)s'))
+    
+    logger.addHandler(logging.handlers.QueueHandler(fila))
+    logger.propagate = False
+    # --quiet: mensagens por pacote (INFO) são descartadas, só avisos e erros aparecem
+    logger.setLevel(logging.WARNING if quiet else logging.INFO)
+    
+    listener = logging.handlers.QueueListener(fila, saida)
+    listener.start()
+    return listener
+
 def main():
     """Função principal"""
+    parser = argparse.ArgumentParser(description="Gateway Bridge - LoRa → Servidor HTTP")
+    parser.add_argument('--quiet', action='store_true',
+                        help="não exibe uma mensagem por pacote (só avisos e erros)")
+    args = parser.parse_args()
+    listener = configurar_log(args.quiet)
+    
     print("\n" + "="*60)
     print("  GATEWAY BRIDGE - LoRa → Servidor HTTP")
     print("="*60)
@@ -200,6 +408,7 @@ def main():
     ser = conectar_serial()
     if not ser:
         print("\n❌ Não foi possível conectar. Encerrando.")
+        listener.stop()
         return
     
     print("="*60)
@@ -212,27 +421,30 @@ def main():
     
     try:
         while True:
-            # lê linha da serial
-            if ser.in_waiting:
-                try:
-                    linha = ser.readline().decode('utf-8', errors='ignore').strip()
+            # readline bloqueia no kernel até chegar '\n' ou estourar o timeout
+            # da serial, sem polling; o timeout mantém o Ctrl+C responsivo
+            try:
+                linha = ser.readline().strip()
+                
+                if linha:
+                    processar_linha_serial(linha)
+                
+                # Serial ociosa: não segura pacotes no buffer
+                if not ser.in_waiting:
+                    descarregar_buffer()
                     
-                    if linha:
-                        processar_linha_serial(linha)
-                        
-                except UnicodeDecodeError:
-                    pass  # Ignora caracteres inválidos
-                except Exception as e:
-                    print(f"⚠️  Erro ao ler serial: {e}")
-            
-            time.sleep(0.01)  # Pequeno delay
+            except Exception as e:
+                logger.warning("⚠️  Erro ao ler serial: %s", e)
             
     except KeyboardInterrupt:
         print("\n\n⏹️  Parando bridge...")
     except Exception as e:
         print(f"\n❌ Erro fatal: {e}")
     finally:
+        descarregar_buffer()
         ser.close()
+        fechar_conexao()
+        listener.stop()  # escreve o que ainda estiver na fila de log
         exibir_estatisticas()
         print("✓ Bridge encerrado\n")
 
@@ -3,950 +3,1525 @@
 Código do servidor
 """
 
+import argparse
+import contextlib
+import functools
+import gzip
+import hashlib
 import http.server
-import socketserver
-import json
+import logging
+import logging.handlers
+import pathlib
+import queue
 import sqlite3
+import sys
+import threading
 from datetime import datetime
-from urllib.parse import parse_qs, urlparse
+from urllib.parse import parse_qsl, urlparse
+
+# orjson é opcional: bem mais rápido que o json da stdlib e já devolve bytes
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    import json
+
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
 
 # Configurações
 PORT = 8000
 DB_FILE = 'monitoramento.db'
+TAMANHO_LOTE_ESCRITA = 500  # máximo de leituras por transação da thread escritora
+TAMANHO_FILA_ESCRITA = 10000  # leituras pendentes antes de o POST esperar o escritor
+TAMANHO_MINIMO_GZIP = 1024  # respostas JSON menores que isso vão sem compressão
+TAMANHO_MAXIMO_SENSOR_ID = 50  # mesmo limite que o gateway_bridge aplica
+TAMANHO_MAXIMO_CORPO = 1024 * 1024  # bytes aceitos num POST (lote de leituras incluso)
+
+logger = logging.getLogger('servidor')
+
+# Texto fixo: o cache de statements do sqlite3 reaproveita o INSERT já compilado
+SQL_INSERIR = '''
+    INSERT INTO leituras (timestamp, sensor_id, temperatura, umidade, poeira)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+# Últimas N leituras posteriores a since_id. id é INTEGER PRIMARY KEY (alias do
+# rowid): id > ? ORDER BY id DESC LIMIT vira uma varredura reversa do rowid que
+# para após N linhas; com sensor_id o mesmo acontece em idx_leituras_sensor_id
+SQL_LEITURAS = '''
+    SELECT id, timestamp, sensor_id, temperatura, umidade, poeira
+    FROM leituras
+    WHERE id > ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+SQL_LEITURAS_SENSOR = '''
+    SELECT id, timestamp, sensor_id, temperatura, umidade, poeira
+    FROM leituras
+    WHERE sensor_id = ? AND id > ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+
+# Agregados das últimas N leituras: o SQLite devolve 10 números em vez de N linhas
+# Arredonda para 2 casas no próprio SQLite: o dashboard mostra 1 casa e a média
+# sem arredondar vira números de 16 dígitos no JSON
+SQL_ESTATISTICAS = '''
+    SELECT COUNT(*),
+           ROUND(MIN(temperatura), 2), ROUND(AVG(temperatura), 2), ROUND(MAX(temperatura), 2),
+           ROUND(MIN(umidade), 2), ROUND(AVG(umidade), 2), ROUND(MAX(umidade), 2),
+           ROUND(MIN(poeira), 2), ROUND(AVG(poeira), 2), ROUND(MAX(poeira), 2)
+    FROM (
+        SELECT temperatura, umidade, poeira
+        FROM leituras
+        ORDER BY id DESC
+        LIMIT ?
+    )
+'''
+SQL_ESTATISTICAS_SENSOR = '''
+    SELECT COUNT(*),
+           ROUND(MIN(temperatura), 2), ROUND(AVG(temperatura), 2), ROUND(MAX(temperatura), 2),
+           ROUND(MIN(umidade), 2), ROUND(AVG(umidade), 2), ROUND(MAX(umidade), 2),
+           ROUND(MIN(poeira), 2), ROUND(AVG(poeira), 2), ROUND(MAX(poeira), 2)
+    FROM (
+        SELECT temperatura, umidade, poeira
+        FROM leituras
+        WHERE sensor_id = ?
+        ORDER BY id DESC
+        LIMIT ?
+    )
+'''
+
+def linha_para_leitura(cursor, row):
+    """row_factory que entrega cada linha já no formato JSON de /api/leituras"""
+    return {
+        'id': row[0],
+        'timestamp': row[1],
+        'sensor_id': row[2],
+        'temperatura': row[3],
+        'umidade': row[4],
+        'poeira': row[5]
+    }
 
 class MonitoringDatabase:
     """Gerencia o banco de dados SQLite"""
     
     def __init__(self, db_file):
         self.db_file = db_file
+        # Conexão de escrita única reaproveitada entre requisições (autocommit),
+        # protegida por lock pois o servidor pode atender em várias threads
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        # Conexões somente-leitura reaproveitadas; sob WAL não esperam o escritor
+        self.leitores = queue.Queue()
+        self.uri_leitura = pathlib.Path(db_file).absolute().as_uri() + '?mode=ro'
         self.init_database()
+        
+        # Leituras avulsas entram numa fila limitada e uma thread as grava em lote,
+        # trocando um commit por POST por um commit por lote
+        self.fila = queue.Queue(maxsize=TAMANHO_FILA_ESCRITA)
+        self.escritor = threading.Thread(target=self.gravar_fila, daemon=True)
+        self.escritor.start()
     
     def init_database(self):
-        """Cria tabela se não existir"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS leituras (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                sensor_id TEXT NOT NULL,
-                temperatura REAL,
-                umidade REAL,
-                poeira REAL
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        """Configura a conexão (WAL) e cria tabela se não existir"""
+        with self.lock:
+            cursor = self.conn.cursor()
+            # WAL: inserts viram appends no log, leituras não bloqueiam escritas
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute('PRAGMA temp_store=MEMORY')
+            cursor.execute('PRAGMA cache_size=-20000')
+            # Páginas lidas direto do mapeamento do arquivo, sem cópia para o cache do SQLite
+            cursor.execute('PRAGMA mmap_size=268435456')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS leituras (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    sensor_id TEXT NOT NULL,
+                    temperatura REAL,
+                    umidade REAL,
+                    poeira REAL
+                )
+            ''')
+            # Busca por sensor vira seek no índice, já na ordem de id DESC
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_leituras_sensor_id
+                ON leituras (sensor_id, id DESC)
+            ''')
+            # Maior id já gravado: versão dos dados usada como ETag das APIs de leitura
+            self.ultimo_id = cursor.execute('SELECT MAX(id) FROM leituras').fetchone()[0] or 0
         print(f"✓ Banco de dados iniciado: {self.db_file}")
     
-    def inserir_leitura(self, sensor_id, temperatura, umidade, poeira):
-        """Insere nova leitura no banco"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        timestamp = datetime.now().isoformat()
-        cursor.execute('''
-            INSERT INTO leituras (timestamp, sensor_id, temperatura, umidade, poeira)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (timestamp, sensor_id, temperatura, umidade, poeira))
-        conn.commit()
-        conn.close()
-        print(f"✓ Leitura armazenada: {sensor_id} - T:{temperatura}°C U:{umidade}% P:{poeira}µg/m³")
+    def inserir_leitura(self, sensor_id, temperatura, umidade, poeira, timestamp=None):
+        """Enfileira nova leitura para a thread escritora (timestamp ISO já normalizado por extrair_leitura; sem ele, usa o horário atual)"""
+        timestamp = timestamp or datetime.now().isoformat()
+        self.fila.put((timestamp, sensor_id, temperatura, umidade, poeira))
+        logger.info("✓ Leitura armazenada: %s - T:%s°C U:%s%% P:%sµg/m³", sensor_id, temperatura, umidade, poeira)
     
-    def obter_ultimas_leituras(self, limite=20, sensor_id=None):
-        """Retorna as últimas N leituras, opcionalmente filtradas por sensor_id"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
-        if sensor_id and sensor_id != 'TODOS':
-            cursor.execute('''
-                SELECT timestamp, sensor_id, temperatura, umidade, poeira
-                FROM leituras
-                WHERE sensor_id = ?
-                ORDER BY id DESC
-                LIMIT ?
-            ''', (sensor_id, limite))
-        else:
-            cursor.execute('''
-                SELECT timestamp, sensor_id, temperatura, umidade, poeira
-                FROM leituras
-                ORDER BY id DESC
-                LIMIT ?
-            ''', (limite,))
+    def inserir_leituras(self, leituras):
+        """Insere um lote de leituras (sensor_id, temperatura, umidade, poeira, timestamp) numa única transação"""
+        agora = datetime.now().isoformat()
+        self.gravar_linhas([
+            (timestamp or agora, sensor_id, temperatura, umidade, poeira)
+            for sensor_id, temperatura, umidade, poeira, timestamp in leituras
+        ])
+        logger.info("✓ Lote armazenado: %d leituras", len(leituras))
+    
+    def gravar_linhas(self, linhas):
+        """Grava linhas (timestamp, sensor_id, temperatura, umidade, poeira) com um único executemany/commit"""
+        # Lote vazio não insere nada: last_insert_rowid() viria 0 e rebobinaria a versão
+        if not linhas:
+            return
+        with self.lock:
+            self.conn.execute('BEGIN')
+            try:
+                self.conn.executemany(SQL_INSERIR, linhas)
+                ultimo_id = self.conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            # Só depois do COMMIT: a nova versão já está visível para os leitores.
+            # max(): a versão nunca anda para trás, mesmo que o rowid não avance
+            self.ultimo_id = max(self.ultimo_id, ultimo_id)
+    
+    def gravar_fila(self):
+        """Thread escritora: junta o que acumulou na fila e grava numa transação só"""
+        ativo = True
+        while ativo:
+            linhas = [self.fila.get()]
+            # Drena sem bloquear o que chegou enquanto o lote anterior era gravado
+            while len(linhas) < TAMANHO_LOTE_ESCRITA:
+                try:
+                    linhas.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+            
+            # None é o aviso de encerramento enviado por fechar()
+            if None in linhas:
+                ativo = False
+                linhas = [linha for linha in linhas if linha is not None]
+            
+            if linhas:
+                self.gravar_lote_fila(linhas)
+    
+    def gravar_lote_fila(self, linhas):
+        """Grava um lote da fila; se falhar, regrava linha a linha e descarta só as inválidas"""
+        # Qualquer exceção aqui mataria a thread escritora e a fila pararia de
+        # ser drenada: os POSTs seguiriam recebendo 200 e bloqueariam no put()
+        try:
+            self.gravar_linhas(linhas)
+            return
+        except Exception as e:
+            if len(linhas) == 1:
+                logger.error("❌ Leitura descartada %r: %s", linhas[0], e)
+                return
+            logger.error("❌ Erro ao gravar lote de %d leituras, gravando uma a uma: %s", len(linhas), e)
         
-        resultados = cursor.fetchall()
-        conn.close()
+        # Os clientes já receberam 200: uma linha ruim não pode derrubar o lote todo
+        for linha in linhas:
+            try:
+                self.gravar_linhas([linha])
+            except Exception as e:
+                logger.error("❌ Leitura descartada %r: %s", linha, e)
+    
+    def fechar(self):
+        """Grava o que restar na fila e encerra a thread escritora"""
+        self.fila.put(None)
+        self.escritor.join()
+    
+    @contextlib.contextmanager
+    def conexao_leitura(self):
+        """Empresta uma conexão somente-leitura do pool, abrindo outra se todas estiverem em uso"""
+        try:
+            conn = self.leitores.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(self.uri_leitura, uri=True, check_same_thread=False)
+            conn.execute('PRAGMA cache_size=-20000')
+            conn.execute('PRAGMA mmap_size=268435456')
+        try:
+            yield conn
+        finally:
+            self.leitores.put(conn)
+    
+    def obter_ultimas_leituras(self, limite=20, sensor_id=None, since_id=0):
+        """Retorna as últimas N leituras com id > since_id, opcionalmente filtradas por sensor_id"""
+        with self.conexao_leitura() as conn:
+            # A fábrica de linhas monta o dict durante o fetchall, sem lista intermediária de tuplas
+            cursor = conn.cursor()
+            cursor.row_factory = linha_para_leitura
+            
+            if sensor_id and sensor_id != 'TODOS':
+                cursor.execute(SQL_LEITURAS_SENSOR, (sensor_id, since_id, limite))
+            else:
+                cursor.execute(SQL_LEITURAS, (since_id, limite))
+            return cursor.fetchall()
+    
+    def obter_estatisticas(self, limite=20, sensor_id=None):
+        """Retorna mínimo, média e máximo de cada métrica nas últimas N leituras (calculado pelo SQLite)"""
+        # Duas consultas fixas em vez de (?='TODOS' OR sensor_id=?): com o OR o
+        # planejador não usa o índice de sensor_id e varre a tabela inteira
+        with self.conexao_leitura() as conn:
+            if sensor_id and sensor_id != 'TODOS':
+                row = conn.execute(SQL_ESTATISTICAS_SENSOR, (sensor_id, limite)).fetchone()
+            else:
+                row = conn.execute(SQL_ESTATISTICAS, (limite,)).fetchone()
         
-        leituras = []
-        for row in resultados:
-            leituras.append({
-                'timestamp': row[0],
-                'sensor_id': row[1],
-                'temperatura': row[2],
-                'umidade': row[3],
-                'poeira': row[4]
-            })
-        return leituras
+        return {
+            'total': row[0],
+            'temperatura': {'min': row[1], 'media': row[2], 'max': row[3]},
+            'umidade': {'min': row[4], 'media': row[5], 'max': row[6]},
+            'poeira': {'min': row[7], 'media': row[8], 'max': row[9]}
+        }
 
 # Instância global do banco de dados
 db = MonitoringDatabase(DB_FILE)
 
-class ReusableTCPServer(socketserver.TCPServer):
-    """TCPServer que permite reutilizar endereço (resolve problemas no WSL)"""
+class ReusableHTTPServer(http.server.ThreadingHTTPServer):
+    """Servidor com uma thread por requisição que permite reutilizar endereço (resolve problemas no WSL)"""
     allow_reuse_address = True
+    daemon_threads = True
+    # Fila de listen() maior que o padrão (5): vários sensores e o dashboard
+    # conectando ao mesmo tempo não recebem recusa enquanto as threads sobem
+    request_queue_size = 64
 
-class MonitoringHandler(http.server.SimpleHTTPRequestHandler):
-    """Handler HTTP para requisições do servidor"""
+# CSS e JS do dashboard: servidos como arquivos estáticos com o hash do conteúdo
+# no nome, para o navegador guardá-los indefinidamente e só baixar a página
+DASHBOARD_CSS = """
+* {
+    margin: 0;
+    padding: 0;
+    box-sizing: border-box;
+}
+body {
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    padding: 20px;
+    min-height: 100vh;
+}
+.header {
+    text-align: center;
+    color: white;
+    margin-bottom: 30px;
+}
+.header h1 {
+    font-size: 32px;
+    font-weight: 600;
+    margin-bottom: 5px;
+}
+.header p {
+    font-size: 14px;
+    opacity: 0.9;
+}
+.container {
+    max-width: 1400px;
+    margin: 0 auto;
+}
+
+.timeframe-selector {
+    background: white;
+    border-radius: 12px;
+    padding: 15px 20px;
+    margin-bottom: 20px;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+    display: flex;
+    align-items: center;
+    gap: 10px;
+}
+.timeframe-selector label {
+    font-weight: 600;
+    color: #333;
+    font-size: 14px;
+    margin-right: 10px;
+}
+.timeframe-btn {
+    padding: 8px 20px;
+    border: 2px solid #e0e0e0;
+    background: white;
+    border-radius: 8px;
+    font-size: 13px;
+    font-weight: 600;
+    cursor: pointer;
+    transition: all 0.3s;
+    color: #666;
+}
+.timeframe-btn:hover {
+    border-color: #667eea;
+    color: #667eea;
+}
+.timeframe-btn.active {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    color: white;
+    border-color: transparent;
+}
+
+.control-panel {
+    background: white;
+    border-radius: 12px;
+    padding: 20px;
+    margin-bottom: 20px;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+    display: flex;
+    align-items: center;
+    gap: 15px;
+    flex-wrap: wrap;
+}
+.control-panel label {
+    font-weight: 600;
+    color: #333;
+    font-size: 14px;
+}
+.control-panel input,
+.control-panel select {
+    padding: 10px 15px;
+    border: 2px solid #e0e0e0;
+    border-radius: 8px;
+    font-size: 14px;
+    transition: border-color 0.3s;
+}
+.control-panel input {
+    width: 120px;
+}
+.control-panel select {
+    width: 200px;
+    cursor: pointer;
+}
+.control-panel input:focus,
+.control-panel select:focus {
+    outline: none;
+    border-color: #667eea;
+}
+.control-panel button {
+    padding: 10px 25px;
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    color: white;
+    border: none;
+    border-radius: 8px;
+    font-size: 14px;
+    font-weight: 600;
+    cursor: pointer;
+    transition: transform 0.2s, box-shadow 0.2s;
+}
+.control-panel button:hover {
+    transform: translateY(-2px);
+    box-shadow: 0 4px 12px rgba(102, 126, 234, 0.4);
+}
+.control-panel button:active {
+    transform: translateY(0);
+}
+.control-panel .auto-refresh {
+    display: flex;
+    align-items: center;
+    gap: 8px;
+    margin-left: auto;
+}
+.control-panel .auto-refresh input[type="checkbox"] {
+    width: auto;
+    cursor: pointer;
+}
+.metrics-grid {
+    display: grid;
+    grid-template-columns: repeat(3, 1fr);
+    gap: 20px;
+    margin-bottom: 30px;
+}
+
+.metric-card {
+    background: white;
+    border-radius: 12px;
+    padding: 20px;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+    transition: all 0.3s;
+    position: relative;
+    overflow: hidden;
+}
+.metric-card::before {
+    content: '';
+    position: absolute;
+    top: 0;
+    left: 0;
+    right: 0;
+    height: 4px;
+    background: #667eea;
+    transition: all 0.3s;
+}
+.metric-card.alert-normal::before {
+    background: #10b981;
+}
+.metric-card.alert-warning::before {
+    background: #f59e0b;
+    height: 6px;
+}
+.metric-card.alert-danger::before {
+    background: #ef4444;
+    height: 8px;
+}
+.metric-card.alert-warning {
+    background: #fffbeb;
+    border: 2px solid #fbbf24;
+}
+.metric-card.alert-danger {
+    background: #fef2f2;
+    border: 2px solid #ef4444;
+    animation: pulse 2s infinite;
+}
+@keyframes pulse {
+    0%, 100% { box-shadow: 0 4px 6px rgba(0,0,0,0.1); }
+    50% { box-shadow: 0 4px 20px rgba(239, 68, 68, 0.4); }
+}
+
+.alert-badge {
+    position: absolute;
+    top: 15px;
+    right: 15px;
+    padding: 4px 10px;
+    border-radius: 12px;
+    font-size: 11px;
+    font-weight: 700;
+    text-transform: uppercase;
+    letter-spacing: 0.5px;
+}
+.alert-badge.normal {
+    background: #d1fae5;
+    color: #065f46;
+}
+.alert-badge.warning {
+    background: #fef3c7;
+    color: #92400e;
+}
+.alert-badge.danger {
+    background: #fee2e2;
+    color: #991b1b;
+}
+
+.metric-card h3 {
+    color: #333;
+    font-size: 14px;
+    font-weight: 600;
+    margin-bottom: 15px;
+    text-transform: uppercase;
+    letter-spacing: 0.5px;
+}
+.metric-stats {
+    display: flex;
+    justify-content: space-between;
+    margin-bottom: 10px;
+}
+.metric-stats div {
+    text-align: center;
+}
+.metric-stats label {
+    display: block;
+    font-size: 11px;
+    color: #888;
+    margin-bottom: 5px;
+}
+.metric-stats span {
+    font-size: 18px;
+    font-weight: 600;
+    color: #333;
+}
+.graphs-grid {
+    display: grid;
+    grid-template-columns: repeat(3, 1fr);
+    gap: 20px;
+    margin-bottom: 30px;
+}
+.graph-card {
+    background: white;
+    border-radius: 12px;
+    padding: 25px;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+}
+.graph-card h3 {
+    color: #333;
+    font-size: 16px;
+    font-weight: 600;
+    margin-bottom: 20px;
+}
+.chart-container {
+    position: relative;
+    height: 250px;
+}
+.table-card {
+    background: white;
+    border-radius: 12px;
+    padding: 25px;
+    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+}
+.table-card h3 {
+    color: #333;
+    font-size: 18px;
+    font-weight: 600;
+    margin-bottom: 20px;
+}
+table {
+    width: 100%;
+    border-collapse: collapse;
+}
+th {
+    background-color: #f8f9fa;
+    padding: 12px;
+    text-align: left;
+    font-size: 12px;
+    font-weight: 600;
+    color: #666;
+    text-transform: uppercase;
+    letter-spacing: 0.5px;
+    border-bottom: 2px solid #e9ecef;
+}
+td {
+    padding: 12px;
+    border-bottom: 1px solid #e9ecef;
+    font-size: 14px;
+    color: #333;
+}
+tr:hover {
+    background-color: #f8f9fa;
+}
+.footer {
+    text-align: center;
+    color: white;
+    margin-top: 30px;
+    font-size: 13px;
+    opacity: 0.9;
+}
+.loading {
+    display: none;
+    color: #667eea;
+    font-size: 14px;
+    font-weight: 600;
+}
+.loading.active {
+    display: inline-block;
+}
+"""
+
+DASHBOARD_JS = """
+let chartTemp, chartUmid, chartPoeira;
+let currentTimeframe = 10;
+let autoRefreshTimer;
+
+const ALERT_THRESHOLDS = {
+    temperatura: { min: 18, max: 25, warning_min: 20, warning_max: 23 },
+    umidade: { min: 30, max: 70, warning_min: 35, warning_max: 65 },
+    poeira: { max: 50, warning_max: 40 }
+};
+
+const ALERT_STATE = {
+    temperatura: { history: [], persist: 0 },
+    umidade:     { history: [], persist: 0 },
+    poeira:      { history: [], persist: 0 }
+};
+
+const PONTOS_COM_MARCADOR = 100;   // séries maiores são desenhadas só como linha
+const HISTORY_LENGTH = 8;          // quantas médias recentes guardar
+const PERSISTENCIA_LIMITE = 3;     // quantas leituras seguidas em alerta
+
+// Série acumulada no navegador: a cada ciclo só as leituras com id > ultimoId
+// são baixadas e anexadas, descartando do início o que sai do timeframe.
+// Os gráficos usam estas mesmas arrays, então nunca são reatribuídas
+const serie = { timestamps: [], temperaturas: [], umidades: [], poeiras: [], recentes: [] };
+let ultimoId = 0;
+let filtroAtual = "";
+
+function reiniciarSerie() {
+    for (const chave in serie) {
+        serie[chave].length = 0;
+    }
+    ultimoId = 0;
+}
+
+function linhaTabela(l) {
+    return `
+        <tr>
+            <td>${l.timestamp.substring(0, 19)}</td>
+            <td>${l.sensor_id}</td>
+            <td>${l.temperatura.toFixed(1)} °C</td>
+            <td>${l.umidade.toFixed(1)} %</td>
+            <td>${l.poeira.toFixed(1)} µg/m³</td>
+        </tr>
+    `;
+}
+
+// Devolve true se alguma leitura nova entrou na série
+function anexarLeituras(leituras) {
+    let anexou = false;
+    // API devolve da mais nova para a mais antiga; anexa em ordem cronológica
+    for (let i = leituras.length - 1; i >= 0; i--) {
+        const l = leituras[i];
+        if (l.id <= ultimoId) continue; // já anexada por uma atualização concorrente
+        ultimoId = l.id;
+        anexou = true;
+        serie.timestamps.push(l.timestamp.substring(11, 19));
+        serie.temperaturas.push(l.temperatura);
+        serie.umidades.push(l.umidade);
+        serie.poeiras.push(l.poeira);
+        // só as 10 mais novas vão para a tabela; formata a linha uma única vez
+        if (i < 10) serie.recentes.push(linhaTabela(l));
+    }
+
+    const excesso = serie.timestamps.length - currentTimeframe;
+    if (excesso > 0) {
+        serie.timestamps.splice(0, excesso);
+        serie.temperaturas.splice(0, excesso);
+        serie.umidades.splice(0, excesso);
+        serie.poeiras.splice(0, excesso);
+    }
+    if (serie.recentes.length > 10) {
+        serie.recentes.splice(0, serie.recentes.length - 10);
+    }
+    return anexou;
+}
+
+function setTimeframe(num, el) {
+    currentTimeframe = num;
+
+    document.querySelectorAll(".timeframe-btn").forEach(btn => {
+        btn.classList.remove("active");
+    });
+
+    if (el) {
+        el.classList.add("active");
+    }
+
+    atualizarDados();
+}
+
+// ---- Funções auxiliares de análise ----
+function registrarValor(tipo, valor) {
+    const state = ALERT_STATE[tipo];
+    state.history.push(valor);
+    if (state.history.length > HISTORY_LENGTH) {
+        state.history.shift(); // mantém só os últimos N
+    }
+}
+
+function calcularTendencia(tipo) {
+    const h = ALERT_STATE[tipo].history;
+    if (h.length < 4) return 0; // pouco dado, ignora
+
+    let subindo = 0;
+    for (let i = 1; i < h.length; i++) {
+        if (h[i] > h[i - 1]) subindo++;
+    }
+
+    // se ~70% das médias estão subindo → tendência de alta
+    return subindo >= Math.floor(h.length * 0.7) ? 1 : 0;
+}
+
+function detectarSpike(tipo, multiplicador = 1.3) {
+    const h = ALERT_STATE[tipo].history;
+    if (h.length < 2) return false;
+
+    const penultimo = h[h.length - 2];
+    const ultimo = h[h.length - 1];
+
+    // evita divisão por zero / comparação furada
+    if (penultimo === 0) return false;
+
+    return ultimo > penultimo * multiplicador;
+}
+
+function verificarAlertas(valor, tipo) {
+    const threshold = ALERT_THRESHOLDS[tipo];
+    const state = ALERT_STATE[tipo];
+
+    // registra histórico desta métrica
+    registrarValor(tipo, valor);
+
+    // thresholds "hard" e "soft" em cima da média atual
+    let foraHard, foraSoft;
+
+    if (tipo === "poeira") {
+        foraHard = valor > threshold.max;
+        foraSoft = valor > threshold.warning_max;
+    } else {
+        foraHard = valor < threshold.min || valor > threshold.max;
+        foraSoft = valor < threshold.warning_min || valor > threshold.warning_max;
+    }
+
+    // persistência (quantas médias seguidas fora)
+    if (foraHard || foraSoft) state.persist++;
+    else state.persist = 0;
+
+    const persistente = state.persist >= PERSISTENCIA_LIMITE;
+    const tendenciaAlta = calcularTendencia(tipo);
+    const spike = detectarSpike(tipo);
+
+    // score de risco
+    let risco = 0;
+    if (foraHard) risco += 3;
+    if (foraSoft) risco += 1;
+    if (persistente) risco += 2;
+    if (tendenciaAlta === 1) risco += 1;
+    if (spike) risco += 2;
+
+    if (risco >= 5) return "danger";
+    if (risco >= 2) return "warning";
+    return "normal";
+}
+
+function atualizarCardAlerta(cardId, badgeId, nivel) {
+    const card = campos[cardId];
+    const badge = campos[badgeId];
+
+    card.className = "metric-card alert-" + nivel;
+    badge.className = "alert-badge " + nivel;
+
+    const textos = {
+        normal: "NORMAL",
+        warning: "⚠️ ATENÇÃO",
+        danger: "🚨 CRÍTICO"
+    };
+
+    badge.textContent = textos[nivel];
+}
+
+// Config comum dos gráficos 
+// Sem animação; normalized avisa que os índices já são únicos e ordenados (o Chart.js
+// pula a verificação); tooltip pelo eixo x, pois séries longas ficam sem marcadores
+const commonOptions = {
+    responsive: true,
+    maintainAspectRatio: false,
+    animation: false,
+    normalized: true,
+    interaction: { mode: "index", intersect: false },
+    plugins: { legend: { display: false } },
+    scales: {
+        x: {
+            display: true,
+            grid: { display: false },
+            ticks: { maxTicksLimit: 8 }
+        },
+        y: {
+            display: true,
+            grid: { color: "#f0f0f0" }
+        }
+    }
+};
+
+// Elementos alterados a cada atualização, buscados no DOM uma única vez
+const campos = {};
+
+function inicializarGraficos() {
+    for (const id of [
+        "sensorSelect", "autoRefresh", "tabelaLeituras",
+        "tempMin", "tempMedia", "tempMax",
+        "umidMin", "umidMedia", "umidMax",
+        "poeiraMin", "poeiraMedia", "poeiraMax",
+        "cardTemp", "badgeTemp", "cardUmid", "badgeUmid", "cardPoeira", "badgePoeira"
+    ]) {
+        campos[id] = document.getElementById(id);
+    }
+
+    chartTemp = new Chart(document.getElementById("chartTemp"), {
+        type: "line",
+        data: {
+            labels: serie.timestamps,
+            datasets: [{
+                label: "Temperatura",
+                data: serie.temperaturas,
+                borderColor: "#ff6b6b",
+                backgroundColor: "rgba(255, 107, 107, 0.1)",
+                borderWidth: 2,
+                tension: 0.4,
+                fill: true
+            }]
+        },
+        options: commonOptions
+    });
+
+    chartUmid = new Chart(document.getElementById("chartUmid"), {
+        type: "line",
+        data: {
+            labels: serie.timestamps,
+            datasets: [{
+                label: "Umidade",
+                data: serie.umidades,
+                borderColor: "#4ecdc4",
+                backgroundColor: "rgba(78, 205, 196, 0.1)",
+                borderWidth: 2,
+                tension: 0.4,
+                fill: true
+            }]
+        },
+        options: commonOptions
+    });
+
+    chartPoeira = new Chart(document.getElementById("chartPoeira"), {
+        type: "line",
+        data: {
+            labels: serie.timestamps,
+            datasets: [{
+                label: "Poeira",
+                data: serie.poeiras,
+                borderColor: "#95e1d3",
+                backgroundColor: "rgba(149, 225, 211, 0.1)",
+                borderWidth: 2,
+                tension: 0.4,
+                fill: true
+            }]
+        },
+        options: commonOptions
+    });
+}
+
+// Redesenha os três gráficos no próximo frame. Várias atualizações seguidas
+// (troca de filtro durante um refresh, por exemplo) viram um único desenho
+let desenhoAgendado = false;
+
+function agendarDesenho() {
+    if (desenhoAgendado) return;
+    desenhoAgendado = true;
+    requestAnimationFrame(() => {
+        desenhoAgendado = false;
+        // gráficos: já apontam para as arrays da série, alteradas no lugar;
+        // "none" redesenha sem animar, sem refazer a transição a cada 10 s.
+        // Acima de PONTOS_COM_MARCADOR o marcador de cada ponto some: centenas de
+        // círculos num canvas estreito custam desenho e hit-test sem mostrar nada
+        const raio = serie.timestamps.length > PONTOS_COM_MARCADOR ? 0 : 3;
+        for (const chart of [chartTemp, chartUmid, chartPoeira]) {
+            chart.data.datasets[0].pointRadius = raio;
+            chart.update("none");
+        }
+    });
+}
+
+// Atualiza dados do dashboard
+async function atualizarDados() {
+    const sensor = campos.sensorSelect.value;
+
+    let params = `limite=${currentTimeframe}`;
+    if (sensor !== "TODOS") {
+        params += `&sensor_id=${sensor}`;
+    }
+
+    // trocou sensor ou timeframe: a série recomeça do zero
+    if (params !== filtroAtual) {
+        reiniciarSerie();
+        filtroAtual = params;
+    }
+
+    try {
+        // só leituras novas para gráficos/tabela; min/média/máx já vêm calculados do servidor
+        const [resp, respStats] = await Promise.all([
+            fetch(`/api/leituras?${params}&since_id=${ultimoId}`),
+            fetch(`/api/stats?${params}`)
+        ]);
+        const leituras = await resp.json();
+        const stats = await respStats.json();
+
+        // filtro mudou enquanto a requisição estava em andamento: resposta obsoleta
+        if (params !== filtroAtual) return;
+
+        const novas = Array.isArray(leituras) && anexarLeituras(leituras);
+
+        if (serie.timestamps.length === 0) {
+            campos.tabelaLeituras.innerHTML = '<tr><td colspan="5" style="text-align:center; color:#999;">Aguardando dados...</td></tr>';
+            return;
+        }
+
+        // estatísticas
+        const tempMin = stats.temperatura.min;
+        const tempMax = stats.temperatura.max;
+        const tempMedia = stats.temperatura.media;
+
+        const umidMin = stats.umidade.min;
+        const umidMax = stats.umidade.max;
+        const umidMedia = stats.umidade.media;
+
+        const poeiraMin = stats.poeira.min;
+        const poeiraMax = stats.poeira.max;
+        const poeiraMedia = stats.poeira.media;
+
+        // atualiza cards
+        campos.tempMin.textContent = tempMin.toFixed(1);
+        campos.tempMedia.textContent = tempMedia.toFixed(1);
+        campos.tempMax.textContent = tempMax.toFixed(1);
+
+        campos.umidMin.textContent = umidMin.toFixed(1);
+        campos.umidMedia.textContent = umidMedia.toFixed(1);
+        campos.umidMax.textContent = umidMax.toFixed(1);
+
+        campos.poeiraMin.textContent = poeiraMin.toFixed(1);
+        campos.poeiraMedia.textContent = poeiraMedia.toFixed(1);
+        campos.poeiraMax.textContent = poeiraMax.toFixed(1);
+
+        // ALERTAS: agora usando a MÉDIA de cada métrica (igual antes)
+        const alertaTemp = verificarAlertas(tempMedia, "temperatura");
+        const alertaUmid = verificarAlertas(umidMedia, "umidade");
+        const alertaPoeira = verificarAlertas(poeiraMedia, "poeira");
+
+        atualizarCardAlerta("cardTemp", "badgeTemp", alertaTemp);
+        atualizarCardAlerta("cardUmid", "badgeUmid", alertaUmid);
+        atualizarCardAlerta("cardPoeira", "badgePoeira", alertaPoeira);
+
+        // nenhuma leitura nova: gráficos e tabela já mostram exatamente isso
+        if (!novas) return;
+
+        agendarDesenho();
+
+        // tabela (últimas 10)
+        // as linhas já vêm formatadas de anexarLeituras; só concatena e atribui uma vez
+        // (um único parse do HTML), da mais nova para a mais antiga
+        let linhas = "";
+        for (let i = serie.recentes.length - 1; i >= 0; i--) {
+            linhas += serie.recentes[i];
+        }
+        campos.tabelaLeituras.innerHTML = linhas;
+
+    } catch (e) {
+        console.error("Erro ao carregar dados:", e);
+    }
+}
+
+// auto refresh
+// setTimeout reagendado só quando a atualização anterior termina (em vez de
+// setInterval): com servidor lento ou aba estrangulada as requisições não se acumulam
+const INTERVALO_REFRESH = 10000;
+let refreshPendente = false;     // um ciclo caiu com a aba oculta
+
+function configurarAutoRefresh() {
+    clearTimeout(autoRefreshTimer);
+
+    if (campos.autoRefresh.checked) {
+        autoRefreshTimer = setTimeout(cicloAutoRefresh, INTERVALO_REFRESH);
+    }
+}
+
+async function cicloAutoRefresh() {
+    // aba oculta: não busca nem redesenha; a cadeia para e retoma ao voltar
+    if (document.hidden) {
+        refreshPendente = true;
+        return;
+    }
+    await atualizarDados();
+    configurarAutoRefresh();
+}
+
+document.addEventListener("visibilitychange", () => {
+    if (!document.hidden && refreshPendente) {
+        refreshPendente = false;
+        cicloAutoRefresh();
+    }
+});
+
+document.getElementById("autoRefresh").addEventListener("change", configurarAutoRefresh);
+document.getElementById("sensorSelect").addEventListener("change", atualizarDados);
+
+// Gráficos nascem vazios; a primeira resposta preenche e desenha uma vez só.
+// O timer do auto-refresh só começa a contar depois desse primeiro desenho
+inicializarGraficos();
+cicloAutoRefresh();
+"""
+
+# HTML do dashboard: estático, os dados são buscados pelo JS em /api/leituras e /api/stats.
+# {css} e {js} são trocados pelas URLs versionadas dos arquivos acima
+DASHBOARD_HTML_MODELO = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Dashboard - Monitoramento Ambiental</title>
+    <script src="https://cdnjs.cloudflare.com/ajax/libs/Chart.js/3.9.1/chart.min.js"></script>
+    <link rel="stylesheet" href="{css}">
+</head>
+<body>
+    <div class="header">
+        <h1>Sistema de Monitoramento Ambiental</h1>
+        <p>CIC0236 - Teleinformática e Redes 2</p>
+    </div>
     
-    def do_GET(self):
-        """Responde requisições GET"""
-        parsed_path = urlparse(self.path)
+    <div class="container">
+        <div class="timeframe-selector">
+            <label>📊 Período:</label>
+            <button class="timeframe-btn active" onclick="setTimeframe(10)">Últimos 10</button>
+            <button class="timeframe-btn" onclick="setTimeframe(50)">Últimos 50</button>
+            <button class="timeframe-btn" onclick="setTimeframe(100)">Últimos 100</button>
+            <button class="timeframe-btn" onclick="setTimeframe(500)">Todos</button>
+        </div>
         
-        # Dashboard HTML
-        if parsed_path.path == '/' or parsed_path.path == '/dashboard':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
-            html = self.gerar_dashboard()
-            self.wfile.write(html.encode())
-        
-        # API JSON para obter dados com parâmetros de limite e sensor_id
-        elif parsed_path.path == '/api/leituras':
-            query_params = parse_qs(parsed_path.query)
-            limite = int(query_params.get('limite', [50])[0])
-            sensor_id = query_params.get('sensor_id', [None])[0]
+        <!-- Painel de Controle -->
+        <div class="control-panel">
+            <label for="sensorSelect">Sensor:</label>
+            <select id="sensorSelect">
+                <option value="TODOS">Todos os Sensores</option>
+                <option value="SALA_SERVIDORES_01">Sala Servidores 01</option>
+                <option value="SALA_SERVIDORES_02">Sala Servidores 02</option>
+                <option value="LABORATORIO_REDES">Laboratório de Redes</option>
+            </select>
             
-            # Limita entre 1 e 500 para evitar sobrecarga
-            limite = max(1, min(limite, 500))
+            <button onclick="atualizarDados()">Atualizar</button>
+            <span class="loading" id="loading">Carregando...</span>
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            leituras = db.obter_ultimas_leituras(limite, sensor_id)
-            self.wfile.write(json.dumps(leituras, indent=2).encode())
-        
-        else:
-            self.send_error(404)
-    
-    def do_POST(self):
-        """Recebe dados dos sensores via POST"""
-        if self.path == '/api/sensor':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            
-            try:
-                dados = json.loads(post_data.decode())
-                
-                # Valida campos obrigatórios
-                sensor_id = dados.get('sensor_id', 'desconhecido')
-                temperatura = float(dados.get('temperatura', 0))
-                umidade = float(dados.get('umidade', 0))
-                poeira = float(dados.get('poeira', 0))
-                
-                # Armazena no banco
-                db.inserir_leitura(sensor_id, temperatura, umidade, poeira)
-                
-                # Responde sucesso
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                resposta = {'status': 'sucesso', 'mensagem': 'Dados recebidos'}
-                self.wfile.write(json.dumps(resposta).encode())
-                
-            except Exception as e:
-                self.send_error(400, f'Erro ao processar dados: {str(e)}')
-        else:
-            self.send_error(404)
-    
-    def gerar_dashboard(self):
-        """Gera HTML do dashboard com gráficos, timeframe selector e alertas"""
-        html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Dashboard - Monitoramento Ambiental</title>
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/Chart.js/3.9.1/chart.min.js"></script>
-            <style>
-                * {
-                    margin: 0;
-                    padding: 0;
-                    box-sizing: border-box;
-                }
-                body {
-                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    padding: 20px;
-                    min-height: 100vh;
-                }
-                .header {
-                    text-align: center;
-                    color: white;
-                    margin-bottom: 30px;
-                }
-                .header h1 {
-                    font-size: 32px;
-                    font-weight: 600;
-                    margin-bottom: 5px;
-                }
-                .header p {
-                    font-size: 14px;
-                    opacity: 0.9;
-                }
-                .container {
-                    max-width: 1400px;
-                    margin: 0 auto;
-                }
-                
-                .timeframe-selector {
-                    background: white;
-                    border-radius: 12px;
-                    padding: 15px 20px;
-                    margin-bottom: 20px;
-                    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                    display: flex;
-                    align-items: center;
-                    gap: 10px;
-                }
-                .timeframe-selector label {
-                    font-weight: 600;
-                    color: #333;
-                    font-size: 14px;
-                    margin-right: 10px;
-                }
-                .timeframe-btn {
-                    padding: 8px 20px;
-                    border: 2px solid #e0e0e0;
-                    background: white;
-                    border-radius: 8px;
-                    font-size: 13px;
-                    font-weight: 600;
-                    cursor: pointer;
-                    transition: all 0.3s;
-                    color: #666;
-                }
-                .timeframe-btn:hover {
-                    border-color: #667eea;
-                    color: #667eea;
-                }
-                .timeframe-btn.active {
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    border-color: transparent;
-                }
-                
-                .control-panel {
-                    background: white;
-                    border-radius: 12px;
-                    padding: 20px;
-                    margin-bottom: 20px;
-                    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                    display: flex;
-                    align-items: center;
-                    gap: 15px;
-                    flex-wrap: wrap;
-                }
-                .control-panel label {
-                    font-weight: 600;
-                    color: #333;
-                    font-size: 14px;
-                }
-                .control-panel input,
-                .control-panel select {
-                    padding: 10px 15px;
-                    border: 2px solid #e0e0e0;
-                    border-radius: 8px;
-                    font-size: 14px;
-                    transition: border-color 0.3s;
-                }
-                .control-panel input {
-                    width: 120px;
-                }
-                .control-panel select {
-                    width: 200px;
-                    cursor: pointer;
-                }
-                .control-panel input:focus,
-                .control-panel select:focus {
-                    outline: none;
-                    border-color: #667eea;
-                }
-                .control-panel button {
-                    padding: 10px 25px;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    border: none;
-                    border-radius: 8px;
-                    font-size: 14px;
-                    font-weight: 600;
-                    cursor: pointer;
-                    transition: transform 0.2s, box-shadow 0.2s;
-                }
-                .control-panel button:hover {
-                    transform: translateY(-2px);
-                    box-shadow: 0 4px 12px rgba(102, 126, 234, 0.4);
-                }
-                .control-panel button:active {
-                    transform: translateY(0);
-                }
-                .control-panel .auto-refresh {
-                    display: flex;
-                    align-items: center;
-                    gap: 8px;
-                    margin-left: auto;
-                }
-                .control-panel .auto-refresh input[type="checkbox"] {
-                    width: auto;
-                    cursor: pointer;
-                }
-                .metrics-grid {
-                    display: grid;
-                    grid-template-columns: repeat(3, 1fr);
-                    gap: 20px;
-                    margin-bottom: 30px;
-                }
-                
-                .metric-card {
-                    background: white;
-                    border-radius: 12px;
-                    padding: 20px;
-                    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                    transition: all 0.3s;
-                    position: relative;
-                    overflow: hidden;
-                }
-                .metric-card::before {
-                    content: '';
-                    position: absolute;
-                    top: 0;
-                    left: 0;
-                    right: 0;
-                    height: 4px;
-                    background: #667eea;
-                    transition: all 0.3s;
-                }
-                .metric-card.alert-normal::before {
-                    background: #10b981;
-                }
-                .metric-card.alert-warning::before {
-                    background: #f59e0b;
-                    height: 6px;
-                }
-                .metric-card.alert-danger::before {
-                    background: #ef4444;
-                    height: 8px;
-                }
-                .metric-card.alert-warning {
-                    background: #fffbeb;
-                    border: 2px solid #fbbf24;
-                }
-                .metric-card.alert-danger {
-                    background: #fef2f2;
-                    border: 2px solid #ef4444;
-                    animation: pulse 2s infinite;
-                }
-                @keyframes pulse {
-                    0%, 100% { box-shadow: 0 4px 6px rgba(0,0,0,0.1); }
-                    50% { box-shadow: 0 4px 20px rgba(239, 68, 68, 0.4); }
-                }
-                
-                .alert-badge {
-                    position: absolute;
-                    top: 15px;
-                    right: 15px;
-                    padding: 4px 10px;
-                    border-radius: 12px;
-                    font-size: 11px;
-                    font-weight: 700;
-                    text-transform: uppercase;
-                    letter-spacing: 0.5px;
-                }
-                .alert-badge.normal {
-                    background: #d1fae5;
-                    color: #065f46;
-                }
-                .alert-badge.warning {
-                    background: #fef3c7;
-                    color: #92400e;
-                }
-                .alert-badge.danger {
-                    background: #fee2e2;
-                    color: #991b1b;
-                }
-                
-                .metric-card h3 {
-                    color: #333;
-                    font-size: 14px;
-                    font-weight: 600;
-                    margin-bottom: 15px;
-                    text-transform: uppercase;
-                    letter-spacing: 0.5px;
-                }
-                .metric-stats {
-                    display: flex;
-                    justify-content: space-between;
-                    margin-bottom: 10px;
-                }
-                .metric-stats div {
-                    text-align: center;
-                }
-                .metric-stats label {
-                    display: block;
-                    font-size: 11px;
-                    color: #888;
-                    margin-bottom: 5px;
-                }
-                .metric-stats span {
-                    font-size: 18px;
-                    font-weight: 600;
-                    color: #333;
-                }
-                .graphs-grid {
-                    display: grid;
-                    grid-template-columns: repeat(3, 1fr);
-                    gap: 20px;
-                    margin-bottom: 30px;
-                }
-                .graph-card {
-                    background: white;
-                    border-radius: 12px;
-                    padding: 25px;
-                    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                }
-                .graph-card h3 {
-                    color: #333;
-                    font-size: 16px;
-                    font-weight: 600;
-                    margin-bottom: 20px;
-                }
-                .chart-container {
-                    position: relative;
-                    height: 250px;
-                }
-                .table-card {
-                    background: white;
-                    border-radius: 12px;
-                    padding: 25px;
-                    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                }
-                .table-card h3 {
-                    color: #333;
-                    font-size: 18px;
-                    font-weight: 600;
-                    margin-bottom: 20px;
-                }
-                table {
-                    width: 100%;
-                    border-collapse: collapse;
-                }
-                th {
-                    background-color: #f8f9fa;
-                    padding: 12px;
-                    text-align: left;
-                    font-size: 12px;
-                    font-weight: 600;
-                    color: #666;
-                    text-transform: uppercase;
-                    letter-spacing: 0.5px;
-                    border-bottom: 2px solid #e9ecef;
-                }
-                td {
-                    padding: 12px;
-                    border-bottom: 1px solid #e9ecef;
-                    font-size: 14px;
-                    color: #333;
-                }
-                tr:hover {
-                    background-color: #f8f9fa;
-                }
-                .footer {
-                    text-align: center;
-                    color: white;
-                    margin-top: 30px;
-                    font-size: 13px;
-                    opacity: 0.9;
-                }
-                .loading {
-                    display: none;
-                    color: #667eea;
-                    font-size: 14px;
-                    font-weight: 600;
-                }
-                .loading.active {
-                    display: inline-block;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>Sistema de Monitoramento Ambiental</h1>
-                <p>CIC0236 - Teleinformática e Redes 2</p>
+            <div class="auto-refresh">
+                <input type="checkbox" id="autoRefresh" checked>
+                <label for="autoRefresh">Atualização automática (10s)</label>
             </div>
-            
-            <div class="container">
-                <div class="timeframe-selector">
-                    <label>📊 Período:</label>
-                    <button class="timeframe-btn active" onclick="setTimeframe(10)">Últimos 10</button>
-                    <button class="timeframe-btn" onclick="setTimeframe(50)">Últimos 50</button>
-                    <button class="timeframe-btn" onclick="setTimeframe(100)">Últimos 100</button>
-                    <button class="timeframe-btn" onclick="setTimeframe(500)">Todos</button>
-                </div>
-                
-                <!-- Painel de Controle -->
-                <div class="control-panel">
-                    <label for="sensorSelect">Sensor:</label>
-                    <select id="sensorSelect">
-                        <option value="TODOS">Todos os Sensores</option>
-                        <option value="SALA_SERVIDORES_01">Sala Servidores 01</option>
-                        <option value="SALA_SERVIDORES_02">Sala Servidores 02</option>
-                        <option value="LABORATORIO_REDES">Laboratório de Redes</option>
-                    </select>
-                    
-                    <button onclick="atualizarDados()">Atualizar</button>
-                    <span class="loading" id="loading">Carregando...</span>
-                    
-                    <div class="auto-refresh">
-                        <input type="checkbox" id="autoRefresh" checked>
-                        <label for="autoRefresh">Atualização automática (10s)</label>
+        </div>
+        
+        <!-- Cards de Métricas com Alertas -->
+        <div class="metrics-grid">
+            <div class="metric-card" id="cardTemp">
+                <span class="alert-badge normal" id="badgeTemp">NORMAL</span>
+                <h3>🌡️ Temperatura</h3>
+                <div class="metric-stats">
+                    <div>
+                        <label>Mínima</label>
+                        <span id="tempMin">--</span>
+                    </div>
+                    <div>
+                        <label>Média</label>
+                        <span style="font-size: 24px; color: #667eea;" id="tempMedia">--</span>
+                    </div>
+                    <div>
+                        <label>Máxima</label>
+                        <span id="tempMax">--</span>
                     </div>
                 </div>
-                
-                <!-- Cards de Métricas com Alertas -->
-                <div class="metrics-grid">
-                    <div class="metric-card" id="cardTemp">
-                        <span class="alert-badge normal" id="badgeTemp">NORMAL</span>
-                        <h3>🌡️ Temperatura</h3>
-                        <div class="metric-stats">
-                            <div>
-                                <label>Mínima</label>
-                                <span id="tempMin">--</span>
-                            </div>
-                            <div>
-                                <label>Média</label>
-                                <span style="font-size: 24px; color: #667eea;" id="tempMedia">--</span>
-                            </div>
-                            <div>
-                                <label>Máxima</label>
-                                <span id="tempMax">--</span>
-                            </div>
-                        </div>
+            </div>
+            
+            <div class="metric-card" id="cardUmid">
+                <span class="alert-badge normal" id="badgeUmid">NORMAL</span>
+                <h3>💧 Umidade</h3>
+                <div class="metric-stats">
+                    <div>
+                        <label>Mínima</label>
+                        <span id="umidMin">--</span>
                     </div>
-                    
-                    <div class="metric-card" id="cardUmid">
-                        <span class="alert-badge normal" id="badgeUmid">NORMAL</span>
-                        <h3>💧 Umidade</h3>
-                        <div class="metric-stats">
-                            <div>
-                                <label>Mínima</label>
-                                <span id="umidMin">--</span>
-                            </div>
-                            <div>
-                                <label>Média</label>
-                                <span style="font-size: 24px; color: #667eea;" id="umidMedia">--</span>
-                            </div>
-                            <div>
-                                <label>Máxima</label>
-                                <span id="umidMax">--</span>
-                            </div>
-                        </div>
+                    <div>
+                        <label>Média</label>
+                        <span style="font-size: 24px; color: #667eea;" id="umidMedia">--</span>
                     </div>
-                    
-                    <div class="metric-card" id="cardPoeira">
-                        <span class="alert-badge normal" id="badgePoeira">NORMAL</span>
-                        <h3>💨 Concentração de Poeira</h3>
-                        <div class="metric-stats">
-                            <div>
-                                <label>Mínima</label>
-                                <span id="poeiraMin">--</span>
-                            </div>
-                            <div>
-                                <label>Média</label>
-                                <span style="font-size: 24px; color: #667eea;" id="poeiraMedia">--</span>
-                            </div>
-                            <div>
-                                <label>Máxima</label>
-                                <span id="poeiraMax">--</span>
-                            </div>
-                        </div>
-                        <p style="font-size: 11px; color: #888; margin-top: 10px; text-align: center;">µg/m³</p>
+                    <div>
+                        <label>Máxima</label>
+                        <span id="umidMax">--</span>
                     </div>
                 </div>
-                
-                <!-- Gráficos -->
-                <div class="graphs-grid">
-                    <div class="graph-card">
-                        <h3>Temperatura ao Longo do Tempo</h3>
-                        <div class="chart-container">
-                            <canvas id="chartTemp"></canvas>
-                        </div>
+            </div>
+            
+            <div class="metric-card" id="cardPoeira">
+                <span class="alert-badge normal" id="badgePoeira">NORMAL</span>
+                <h3>💨 Concentração de Poeira</h3>
+                <div class="metric-stats">
+                    <div>
+                        <label>Mínima</label>
+                        <span id="poeiraMin">--</span>
                     </div>
-                    
-                    <div class="graph-card">
-                        <h3>Umidade ao Longo do Tempo</h3>
-                        <div class="chart-container">
-                            <canvas id="chartUmid"></canvas>
-                        </div>
+                    <div>
+                        <label>Média</label>
+                        <span style="font-size: 24px; color: #667eea;" id="poeiraMedia">--</span>
                     </div>
-                    
-                    <div class="graph-card">
-                        <h3>Poeira ao Longo do Tempo</h3>
-                        <div class="chart-container">
-                            <canvas id="chartPoeira"></canvas>
-                        </div>
+                    <div>
+                        <label>Máxima</label>
+                        <span id="poeiraMax">--</span>
                     </div>
                 </div>
-                
-                <!-- Tabela de Dados -->
-                <div class="table-card">
-                    <h3>Últimas Leituras Registradas</h3>
-                    <table>
-                        <thead>
-                            <tr>
-                                <th>Timestamp</th>
-                                <th>Sensor ID</th>
-                                <th>Temperatura</th>
-                                <th>Umidade</th>
-                                <th>Poeira</th>
-                            </tr>
-                        </thead>
-                        <tbody id="tabelaLeituras">
-                            <tr><td colspan="5" style="text-align:center; color: #999;">Carregando dados...</td></tr>
-                        </tbody>
-                    </table>
+                <p style="font-size: 11px; color: #888; margin-top: 10px; text-align: center;">µg/m³</p>
+            </div>
+        </div>
+        
+        <!-- Gráficos -->
+        <div class="graphs-grid">
+            <div class="graph-card">
+                <h3>Temperatura ao Longo do Tempo</h3>
+                <div class="chart-container">
+                    <canvas id="chartTemp"></canvas>
                 </div>
-                
-                <div class="footer">
-                    <p>Total de leituras exibidas: <span id="totalLeituras">0</span> | Sistema operacional</p>
+            </div>
+            
+            <div class="graph-card">
+                <h3>Umidade ao Longo do Tempo</h3>
+                <div class="chart-container">
+                    <canvas id="chartUmid"></canvas>
                 </div>
             </div>
             
-            <script>
-                let chartTemp, chartUmid, chartPoeira;
-                let currentTimeframe = 10;
-                let autoRefreshInterval;
-
-                const ALERT_THRESHOLDS = {
-                    temperatura: { min: 18, max: 25, warning_min: 20, warning_max: 23 },
-                    umidade: { min: 30, max: 70, warning_min: 35, warning_max: 65 },
-                    poeira: { max: 50, warning_max: 40 }
-                };
-
-                const ALERT_STATE = {
-                    temperatura: { history: [], persist: 0 },
-                    umidade:     { history: [], persist: 0 },
-                    poeira:      { history: [], persist: 0 }
-                };
-
-                const HISTORY_LENGTH = 8;          // quantas médias recentes guardar
-                const PERSISTENCIA_LIMITE = 3;     // quantas leituras seguidas em alerta
-
-                function setTimeframe(num, el) {
-                    currentTimeframe = num;
-
-                    document.querySelectorAll(".timeframe-btn").forEach(btn => {
-                        btn.classList.remove("active");
-                    });
-
-                    if (el) {
-                        el.classList.add("active");
-                    }
-
-                    atualizarDados();
-                }
-
-                // ---- Funções auxiliares de análise ----
-                function registrarValor(tipo, valor) {
-                    const state = ALERT_STATE[tipo];
-                    state.history.push(valor);
-                    if (state.history.length > HISTORY_LENGTH) {
-                        state.history.shift(); // mantém só os últimos N
-                    }
-                }
-
-                function calcularTendencia(tipo) {
-                    const h = ALERT_STATE[tipo].history;
-                    if (h.length < 4) return 0; // pouco dado, ignora
-
-                    let subindo = 0;
-                    for (let i = 1; i < h.length; i++) {
-                        if (h[i] > h[i - 1]) subindo++;
-                    }
-
-                    // se ~70% das médias estão subindo → tendência de alta
-                    return subindo >= Math.floor(h.length * 0.7) ? 1 : 0;
-                }
-
-                function detectarSpike(tipo, multiplicador = 1.3) {
-                    const h = ALERT_STATE[tipo].history;
-                    if (h.length < 2) return false;
-
-                    const penultimo = h[h.length - 2];
-                    const ultimo = h[h.length - 1];
-
-                    // evita divisão por zero / comparação furada
-                    if (penultimo === 0) return false;
-
-                    return ultimo > penultimo * multiplicador;
-                }
-
-                function verificarAlertas(valor, tipo) {
-                    const threshold = ALERT_THRESHOLDS[tipo];
-                    const state = ALERT_STATE[tipo];
-
-                    // registra histórico desta métrica
-                    registrarValor(tipo, valor);
-
-                    // thresholds "hard" e "soft" em cima da média atual
-                    let foraHard, foraSoft;
-
-                    if (tipo === "poeira") {
-                        foraHard = valor > threshold.max;
-                        foraSoft = valor > threshold.warning_max;
-                    } else {
-                        foraHard = valor < threshold.min || valor > threshold.max;
-                        foraSoft = valor < threshold.warning_min || valor > threshold.warning_max;
-                    }
-
-                    // persistência (quantas médias seguidas fora)
-                    if (foraHard || foraSoft) state.persist++;
-                    else state.persist = 0;
-
-                    const persistente = state.persist >= PERSISTENCIA_LIMITE;
-                    const tendenciaAlta = calcularTendencia(tipo);
-                    const spike = detectarSpike(tipo);
-
-                    // score de risco
-                    let risco = 0;
-                    if (foraHard) risco += 3;
-                    if (foraSoft) risco += 1;
-                    if (persistente) risco += 2;
-                    if (tendenciaAlta === 1) risco += 1;
-                    if (spike) risco += 2;
-
-                    if (risco >= 5) return "danger";
-                    if (risco >= 2) return "warning";
-                    return "normal";
-                }
-
-                function atualizarCardAlerta(cardId, badgeId, nivel) {
-                    const card = document.getElementById(cardId);
-                    const badge = document.getElementById(badgeId);
-
-                    card.className = "metric-card alert-" + nivel;
-                    badge.className = "alert-badge " + nivel;
-
-                    const textos = {
-                        normal: "NORMAL",
-                        warning: "⚠️ ATENÇÃO",
-                        danger: "🚨 CRÍTICO"
-                    };
-
-                    badge.textContent = textos[nivel];
-                }
-
-                // Config comum dos gráficos 
-                const commonOptions = {
-                    responsive: true,
-                    maintainAspectRatio: false,
-                    plugins: { legend: { display: false } },
-                    scales: {
-                        x: {
-                            display: true,
-                            grid: { display: false },
-                            ticks: { maxTicksLimit: 8 }
-                        },
-                        y: {
-                            display: true,
-                            grid: { color: "#f0f0f0" }
-                        }
-                    }
-                };
-
-                function inicializarGraficos() {
-                    chartTemp = new Chart(document.getElementById("chartTemp"), {
-                        type: "line",
-                        data: {
-                            labels: [],
-                            datasets: [{
-                                label: "Temperatura",
-                                data: [],
-                                borderColor: "#ff6b6b",
-                                backgroundColor: "rgba(255, 107, 107, 0.1)",
-                                borderWidth: 2,
-                                tension: 0.4,
-                                fill: true
-                            }]
-                        },
-                        options: commonOptions
-                    });
-
-                    chartUmid = new Chart(document.getElementById("chartUmid"), {
-                        type: "line",
-                        data: {
-                            labels: [],
-                            datasets: [{
-                                label: "Umidade",
-                                data: [],
-                                borderColor: "#4ecdc4",
-                                backgroundColor: "rgba(78, 205, 196, 0.1)",
-                                borderWidth: 2,
-                                tension: 0.4,
-                                fill: true
-                            }]
-                        },
-                        options: commonOptions
-                    });
-
-                    chartPoeira = new Chart(document.getElementById("chartPoeira"), {
-                        type: "line",
-                        data: {
-                            labels: [],
-                            datasets: [{
-                                label: "Poeira",
-                                data: [],
-                                borderColor: "#95e1d3",
-                                backgroundColor: "rgba(149, 225, 211, 0.1)",
-                                borderWidth: 2,
-                                tension: 0.4,
-                                fill: true
-                            }]
-                        },
-                        options: commonOptions
-                    });
-                }
-
-                // Atualiza dados do dashboard
-                async function atualizarDados() {
-                    const sensor = document.getElementById("sensorSelect").value;
-
-                    let url = `/api/leituras?limite=${currentTimeframe}`;
-                    if (sensor !== "TODOS") {
-                        url += `&sensor_id=${sensor}`;
-                    }
-
-                    try {
-                        const resp = await fetch(url);
-                        const leituras = await resp.json();
-
-                        if (!Array.isArray(leituras) || leituras.length === 0) {
-                            const tbody = document.getElementById("tabelaLeituras");
-                            tbody.innerHTML = '<tr><td colspan="5" style="text-align:center; color:#999;">Aguardando dados...</td></tr>';
-                            return;
-                        }
-
-                        // ordem cronológica
-                        const dados = leituras.slice().reverse();
-
-                        const timestamps = dados.map(l => l.timestamp.substring(11, 19));
-                        const temperaturas = dados.map(l => l.temperatura);
-                        const umidades = dados.map(l => l.umidade);
-                        const poeiras = dados.map(l => l.poeira);
-
-                        // estatísticas
-                        const tempMin = Math.min(...temperaturas);
-                        const tempMax = Math.max(...temperaturas);
-                        const tempMedia = temperaturas.reduce((a, b) => a + b, 0) / temperaturas.length;
-
-                        const umidMin = Math.min(...umidades);
-                        const umidMax = Math.max(...umidades);
-                        const umidMedia = umidades.reduce((a, b) => a + b, 0) / umidades.length;
-
-                        const poeiraMin = Math.min(...poeiras);
-                        const poeiraMax = Math.max(...poeiras);
-                        const poeiraMedia = poeiras.reduce((a, b) => a + b, 0) / poeiras.length;
-
-                        // atualiza cards
-                        document.getElementById("tempMin").textContent = tempMin.toFixed(1);
-                        document.getElementById("tempMedia").textContent = tempMedia.toFixed(1);
-                        document.getElementById("tempMax").textContent = tempMax.toFixed(1);
-
-                        document.getElementById("umidMin").textContent = umidMin.toFixed(1);
-                        document.getElementById("umidMedia").textContent = umidMedia.toFixed(1);
-                        document.getElementById("umidMax").textContent = umidMax.toFixed(1);
-
-                        document.getElementById("poeiraMin").textContent = poeiraMin.toFixed(1);
-                        document.getElementById("poeiraMedia").textContent = poeiraMedia.toFixed(1);
-                        document.getElementById("poeiraMax").textContent = poeiraMax.toFixed(1);
-
-                        // ALERTAS: agora usando a MÉDIA de cada métrica (igual antes)
-                        const alertaTemp = verificarAlertas(tempMedia, "temperatura");
-                        const alertaUmid = verificarAlertas(umidMedia, "umidade");
-                        const alertaPoeira = verificarAlertas(poeiraMedia, "poeira");
-
-                        atualizarCardAlerta("cardTemp", "badgeTemp", alertaTemp);
-                        atualizarCardAlerta("cardUmid", "badgeUmid", alertaUmid);
-                        atualizarCardAlerta("cardPoeira", "badgePoeira", alertaPoeira);
-
-                        // gráficos
-                        chartTemp.data.labels = timestamps;
-                        chartTemp.data.datasets[0].data = temperaturas;
-                        chartTemp.update();
-
-                        chartUmid.data.labels = timestamps;
-                        chartUmid.data.datasets[0].data = umidades;
-                        chartUmid.update();
-
-                        chartPoeira.data.labels = timestamps;
-                        chartPoeira.data.datasets[0].data = poeiras;
-                        chartPoeira.update();
-
-                        // tabela (últimas 10)
-                        const tbody = document.getElementById("tabelaLeituras");
-                        tbody.innerHTML = "";
-
-                        dados.slice(-10).reverse().forEach(l => {
-                            tbody.innerHTML += `
-                                <tr>
-                                    <td>${l.timestamp.substring(0, 19)}</td>
-                                    <td>${l.sensor_id}</td>
-                                    <td>${l.temperatura.toFixed(1)} °C</td>
-                                    <td>${l.umidade.toFixed(1)} %</td>
-                                    <td>${l.poeira.toFixed(1)} µg/m³</td>
-                                </tr>
-                            `;
-                        });
-
-                    } catch (e) {
-                        console.error("Erro ao carregar dados:", e);
-                    }
-                }
-
-                // auto refresh
-                function configurarAutoRefresh() {
-                    if (autoRefreshInterval) {
-                        clearInterval(autoRefreshInterval);
-                    }
-
-                    if (document.getElementById("autoRefresh").checked) {
-                        autoRefreshInterval = setInterval(atualizarDados, 10000);
-                    }
-                }
-
-                document.getElementById("autoRefresh").addEventListener("change", configurarAutoRefresh);
-                document.getElementById("sensorSelect").addEventListener("change", atualizarDados);
-
-                inicializarGraficos();
-                atualizarDados();
-                configurarAutoRefresh();
-            </script>
-        </body>
-        </html>
-        """
-        return html
+            <div class="graph-card">
+                <h3>Poeira ao Longo do Tempo</h3>
+                <div class="chart-container">
+                    <canvas id="chartPoeira"></canvas>
+                </div>
+            </div>
+        </div>
+        
+        <!-- Tabela de Dados -->
+        <div class="table-card">
+            <h3>Últimas Leituras Registradas</h3>
+            <table>
+                <thead>
+                    <tr>
+                        <th>Timestamp</th>
+                        <th>Sensor ID</th>
+                        <th>Temperatura</th>
+                        <th>Umidade</th>
+                        <th>Poeira</th>
+                    </tr>
+                </thead>
+                <tbody id="tabelaLeituras">
+                    <tr><td colspan="5" style="text-align:center; color: #999;">Carregando dados...</td></tr>
+                </tbody>
+            </table>
+        </div>
+        
+        <div class="footer">
+            <p>Total de leituras exibidas: <span id="totalLeituras">0</span> | Sistema operacional</p>
+        </div>
+    </div>
+    
+    <script src="{js}"></script>
+</body>
+</html>
+"""
+
+# Respostas estáticas prontas desde a importação: caminho -> (tipo, corpo, corpo gzip, ETag, Cache-Control)
+ARQUIVOS_ESTATICOS = {}
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+def compactar(texto):
+    """Minificação conservadora: tira indentação, linhas vazias e comentários de linha
+    inteira (// no JS, <!-- --> no HTML). As quebras de linha ficam, então a inserção
+    automática de ; do JS e os espaços entre elementos HTML não mudam de sentido"""
+    linhas = []
+    for linha in texto.splitlines():
+        linha = linha.strip()
+        if not linha or linha.startswith('//') or (linha.startswith('<!--') and linha.endswith('-->')):
+            continue
+        linhas.append(linha)
+    return '\n'.join(linhas)
+
+def registrar_estatico(caminho, tipo, conteudo, cache_control):
+    """Minifica, codifica e comprime (nível máximo, uma vez só) o conteúdo servido em caminho"""
+    corpo = compactar(conteudo).encode('utf-8')
+    etag = f'"{hashlib.sha1(corpo).hexdigest()[:16]}"'
+    ARQUIVOS_ESTATICOS[caminho] = (tipo, corpo, gzip.compress(corpo, compresslevel=9), etag, cache_control)
+    return etag
+
+def publicar_versionado(nome, extensao, tipo, conteudo):
+    """Publica em /static/<nome>.<hash>.<extensao> e retorna a URL; o conteúdo nunca muda nela"""
+    versao = hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:12]
+    caminho = f'/static/{nome}.{versao}.{extensao}'
+    registrar_estatico(caminho, tipo, conteudo, CACHE_IMUTAVEL)
+    return caminho
+
+DASHBOARD_HTML = (DASHBOARD_HTML_MODELO
+    .replace('{css}', publicar_versionado('dashboard', 'css', 'text/css; charset=utf-8', DASHBOARD_CSS))
+    .replace('{js}', publicar_versionado('dashboard', 'js', 'text/javascript; charset=utf-8', DASHBOARD_JS)))
+# A página em si é revalidada a cada carga (If-None-Match), já que aponta para as versões atuais
+registrar_estatico('/', 'text/html; charset=utf-8', DASHBOARD_HTML, 'no-cache')
+ARQUIVOS_ESTATICOS['/dashboard'] = ARQUIVOS_ESTATICOS['/']
+
+# Corpo do 404 dos GETs (o navegador pede /favicon.ico a cada carga do dashboard)
+RESPOSTA_404 = json_dumps({'status': 'erro', 'mensagem': 'Recurso não encontrado'})
+
+# Confirmação de uma leitura em /api/sensor: sempre igual, serializada uma vez só
+RESPOSTA_RECEBIDO = json_dumps({'status': 'sucesso', 'mensagem': 'Dados recebidos'})
+
+def serializar_json(dados):
+    """Retorna (corpo, corpo gzip ou None): JSON repete chaves, sensor_id e datas,
+    então o nível 1 já reduz bastante e custa pouco; respostas pequenas vão sem compressão"""
+    corpo = json_dumps(dados)
+    if len(corpo) < TAMANHO_MINIMO_GZIP:
+        return corpo, None
+    return corpo, gzip.compress(corpo, compresslevel=1)
+
+# Respostas das APIs de leitura já serializadas, por versão dos dados (db.ultimo_id):
+# vários dashboards abertos pagam uma única consulta e serialização por gravação.
+# Uma gravação nova muda a chave, então entradas antigas só saem pelo LRU
+@functools.lru_cache(maxsize=128)
+def resposta_leituras(versao, limite, sensor_id, since_id):
+    return serializar_json(db.obter_ultimas_leituras(limite, sensor_id, since_id))
+
+@functools.lru_cache(maxsize=128)
+def resposta_estatisticas(versao, limite, sensor_id):
+    return serializar_json(db.obter_estatisticas(limite, sensor_id))
+
+class MonitoringHandler(http.server.SimpleHTTPRequestHandler):
+    """Handler HTTP para requisições do servidor"""
+    
+    # rfile com buffer de 64 KB: um lote grande chega em poucos recv(). wfile
+    # bufferizado (o padrão é sem buffer) junta cabeçalhos e corpo num único
+    # send(); o http.server faz flush ao fim de cada requisição
+    rbufsize = 64 * 1024
+    wbufsize = 64 * 1024
+    
+    # HTTP/1.1: a conexão fica aberta entre requisições (toda resposta leva
+    # Content-Length). timeout fecha conexões ociosas, liberando a thread
+    protocol_version = 'HTTP/1.1'
+    timeout = 30
+    
+    def do_GET(self):
+        """Responde requisições GET"""
+        parsed_path = urlparse(self.path)
+        
+        # Dashboard HTML e seus arquivos CSS/JS
+        if parsed_path.path in ARQUIVOS_ESTATICOS:
+            self.enviar_estatico(*ARQUIVOS_ESTATICOS[parsed_path.path])
+        
+        # API JSON para obter dados com parâmetros de limite e sensor_id
+        elif parsed_path.path == '/api/leituras':
+            parametros = self.ler_parametros(parsed_path)
+            if parametros is None:
+                return
+            limite, sensor_id, since_id = parametros
+            # Resposta em cache por versão: sem leitura nova não toca no banco, e
+            # enviar_json responde 304 se o cliente já tem exatamente este corpo
+            versao = db.ultimo_id
+            self.enviar_json(*resposta_leituras(versao, limite, sensor_id, since_id), etag=f'"{versao}"')
+        
+        # API JSON com mínimo/média/máximo das mesmas leituras de /api/leituras
+        elif parsed_path.path == '/api/stats':
+            parametros = self.ler_parametros(parsed_path)
+            if parametros is None:
+                return
+            limite, sensor_id, _ = parametros
+            versao = db.ultimo_id
+            self.enviar_json(*resposta_estatisticas(versao, limite, sensor_id), etag=f'"{versao}"')
+        
+        else:
+            self.enviar_nao_encontrado()
+    
+    def enviar_nao_encontrado(self):
+        """404 com corpo pronto; ao contrário de send_error, não fecha a conexão keep-alive"""
+        self.send_response(404)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(RESPOSTA_404)))
+        self.end_headers()
+        self.wfile.write(RESPOSTA_404)
+    
+    def enviar_estatico(self, tipo, corpo, corpo_gz, etag, cache_control):
+        """Responde um arquivo de ARQUIVOS_ESTATICOS (304 se o navegador já tem esta versão)"""
+        usar_gzip = self.aceita_gzip()
+        etag = self.etag_variante(etag, usar_gzip)
+        if self.nao_modificado(etag):
+            return
+        
+        # Bytes já codificados: uma única escrita, tamanho conhecido de antemão
+        self.send_response(200)
+        self.send_header('Content-type', tipo)
+        if usar_gzip:
+            corpo = corpo_gz
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.wfile.write(corpo)
+    
+    def aceita_gzip(self):
+        """Indica se o cliente aceita gzip em Accept-Encoding, respeitando q=0 e o curinga *"""
+        qualidades = {}
+        for item in self.headers.get('Accept-Encoding', '').split(','):
+            codificacao, *parametros = item.split(';')
+            qualidade = 1.0
+            for parametro in parametros:
+                nome, _, valor = parametro.strip().partition('=')
+                if nome.lower() == 'q':
+                    try:
+                        qualidade = float(valor)
+                    except ValueError:
+                        qualidade = 0.0
+            qualidades[codificacao.strip().lower()] = qualidade
+        
+        qualidade = qualidades.get('gzip', qualidades.get('x-gzip', qualidades.get('*', 0.0)))
+        return qualidade > 0
+    
+    def etag_variante(self, etag, usar_gzip):
+        """ETag do corpo realmente enviado: a versão gzip tem sufixo próprio"""
+        # Mesmo ETag para corpos com e sem gzip confundiria caches intermediários;
+        # já o corpo sem gzip tem um ETag só, aceite o cliente gzip ou não
+        if usar_gzip:
+            return etag[:-1] + '-gz"'
+        return etag
+    
+    def nao_modificado(self, etag):
+        """Responde 304 sem corpo se o cliente já tem a versão etag"""
+        if self.headers.get('If-None-Match') != etag:
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        return True
+    
+    def enviar_json(self, corpo, corpo_gz=None, etag=None):
+        """Responde JSON já serializado com Content-Length (versão gzip se houver e o cliente aceitar; 304 se o etag bater)"""
+        # corpo_gz é None abaixo de TAMANHO_MINIMO_GZIP: aí vai sem gzip e sem sufixo no ETag
+        usar_gzip = corpo_gz is not None and self.aceita_gzip()
+        if etag:
+            etag = self.etag_variante(etag, usar_gzip)
+            if self.nao_modificado(etag):
+                return
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        if usar_gzip:
+            corpo = corpo_gz
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(corpo)))
+        if etag:
+            # no-cache: o navegador sempre revalida, mas com If-None-Match
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(corpo)
+    
+    def ler_parametros(self, parsed_path):
+        """Extrai limite, sensor_id e since_id da query string (None e resposta 400 se inválidos)"""
+        # parse_qsl: pares simples, sem montar uma lista por parâmetro; max_num_fields
+        # recusa query strings absurdas antes de decodificá-las
+        try:
+            query_params = dict(parse_qsl(parsed_path.query, max_num_fields=8))
+            limite = int(query_params.get('limite', 50))
+            # since_id: o dashboard só pede o que chegou depois da última leitura que já tem
+            since_id = int(query_params.get('since_id', 0))
+        except ValueError:
+            self.send_error(400, 'Parâmetros inválidos')
+            return None
+        sensor_id = query_params.get('sensor_id')
+        
+        # Limita entre 1 e 500 para evitar sobrecarga
+        limite = max(1, min(limite, 500))
+        return limite, sensor_id, since_id
+    
+    def do_POST(self):
+        """Recebe dados dos sensores via POST (uma leitura ou um lote)"""
+        # Nos erros o corpo pode ter ficado sem ler: fecha a conexão em vez de
+        # interpretar o resto dele como a próxima requisição
+        if self.path not in ('/api/sensor', '/api/sensor/batch'):
+            self.close_connection = True
+            self.send_error(404)
+            return
+        
+        content_length = self.headers.get('Content-Length')
+        if content_length is None:
+            self.close_connection = True
+            self.send_error(411)
+            return
+        
+        # Só dígitos ASCII: int() aceitaria '-1', '+10', '1_0' e espaços, e um tamanho
+        # maior que o corpo prenderia a thread no read() até o timeout
+        if content_length.isascii() and content_length.isdigit():
+            tamanho = int(content_length)
+        else:
+            tamanho = -1
+        if not 0 <= tamanho <= TAMANHO_MAXIMO_CORPO:
+            self.close_connection = True
+            self.send_error(400, 'Content-Length invalido')
+            return
+        
+        try:
+            post_data = self.rfile.read(tamanho)
+            dados = json_loads(post_data)
+            
+            if self.path == '/api/sensor':
+                # Armazena no banco
+                db.inserir_leitura(*self.extrair_leitura(dados))
+                resposta = RESPOSTA_RECEBIDO
+            else:
+                # Lote: array JSON de leituras, gravado numa única transação
+                if not isinstance(dados, list):
+                    raise ValueError('esperado um array JSON de leituras')
+                # Um pacote corrompido não derruba as leituras boas do mesmo lote:
+                # os itens inválidos são pulados e devolvidos pelo índice
+                leituras = []
+                rejeitadas = []
+                for indice, item in enumerate(dados):
+                    try:
+                        leituras.append(self.extrair_leitura(item))
+                    except (ValueError, TypeError, AttributeError) as e:
+                        logger.warning("⚠️  Item %d do lote recusado: %s", indice, e)
+                        rejeitadas.append(indice)
+                db.inserir_leituras(leituras)
+                resposta = json_dumps({'status': 'sucesso',
+                                       'mensagem': f'{len(leituras)} leituras recebidas',
+                                       'rejeitadas': rejeitadas})
+            
+            # Responde sucesso
+            self.enviar_json(resposta)
+            
+        # Só erros de entrada viram 400 (JSON inválido de json/orjson é ValueError;
+        # campo com tipo errado é TypeError/AttributeError); falha do banco é 500
+        # A frase do status vai na linha de status (latin-1): fica fixa e ASCII, e o
+        # detalhe da exceção (que pode trazer qualquer caractere do cliente) vai pro log
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning("⚠️  POST %s recusado: %s", self.path, e)
+            self.close_connection = True
+            self.send_error(400, 'Dados invalidos')
+        except sqlite3.Error as e:
+            logger.error("❌ Erro ao gravar lote: %s", e)
+            self.close_connection = True
+            self.send_error(500, 'Erro ao gravar leituras')
+    
+    def extrair_leitura(self, dados):
+        """Valida sensor_id, métricas e timestamp_sensor e retorna (sensor_id, temperatura, umidade, poeira, timestamp)"""
+        sensor_id = dados.get('sensor_id', 'desconhecido')
+        # Recusado já na requisição, com a mesma regra do gateway_bridge (string ASCII
+        # não vazia): surrogate solto ou byte de controle não chegam à thread escritora
+        if (not isinstance(sensor_id, str) or not sensor_id
+                or len(sensor_id) > TAMANHO_MAXIMO_SENSOR_ID
+                or not sensor_id.isascii() or not sensor_id.isprintable()):
+            raise ValueError('sensor_id inválido')
+        temperatura = float(dados.get('temperatura', 0))
+        umidade = float(dados.get('umidade', 0))
+        poeira = float(dados.get('poeira', 0))
+        
+        # Reaproveita o timestamp já carimbado pelo bridge/simulador, desde que seja
+        # ISO 8601 de verdade (o dashboard ordena e recorta o eixo de tempo por ele);
+        # qualquer outra coisa cai no horário do servidor
+        timestamp = dados.get('timestamp_sensor')
+        try:
+            timestamp = datetime.fromisoformat(timestamp).isoformat()
+        except (TypeError, ValueError):
+            timestamp = None
+        return sensor_id, temperatura, umidade, poeira, timestamp
     
     def log_message(self, format, *args):
         """Sobrescreve log padrão para mensagens mais limpas"""
         return
 
+def configurar_log(verbose=False):
+    """Log assíncrono: a requisição só enfileira o registro; uma thread escreve no terminal"""
+    fila = queue.Queue(-1)
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(logging.Formatter('%(message)s'))
+    
+    logger.addHandler(logging.handlers.QueueHandler(fila))
+    logger.propagate = False
+    # Sem --verbose as mensagens por leitura (INFO) nem chegam a ser formatadas
+    logger.setLevel(logging.INFO if verbose else logging.WARNING)
+    
+    listener = logging.handlers.QueueListener(fila, saida)
+    listener.start()
+    return listener
+
 def iniciar_servidor():
     """Inicia o servidor HTTP"""
-    with ReusableTCPServer(("", PORT), MonitoringHandler) as httpd:
+    parser = argparse.ArgumentParser(description="Servidor de Monitoramento Ambiental")
+    parser.add_argument('--verbose', action='store_true',
+                        help="exibe uma mensagem por leitura armazenada")
+    args = parser.parse_args()
+    listener = configurar_log(args.verbose)
+    
+    with ReusableHTTPServer(("", PORT), MonitoringHandler) as httpd:
         print("="*60)
         print(" SERVIDOR DE MONITORAMENTO INICIADO")
         print("="*60)
         print(f" Porta: {PORT}")
         print(f" Dashboard: http://localhost:{PORT}/dashboard")
         print(f" API: http://localhost:{PORT}/api/leituras")
+        print(f" Estatísticas: http://localhost:{PORT}/api/stats")
         print(f" Endpoint sensores: POST http://localhost:{PORT}/api/sensor")
+        print(f" Endpoint lote: POST http://localhost:{PORT}/api/sensor/batch")
         print("="*60)
         print("Pressione Ctrl+C para parar o servidor")
         print()
@@ -955,6 +1530,9 @@ def iniciar_servidor():
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n\n  Servidor encerrado")
+        finally:
+            db.fechar()
+            listener.stop()
 
 if __name__ == '__main__':
     iniciar_servidor()
\ No newline at end of file
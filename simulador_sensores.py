@@ -4,16 +4,37 @@ Código que gera dados simulados e envia para o servidor via HTTP
 """
 
 import http.client
-import json
+import select
 import time
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 
+# orjson é opcional: serialização bem mais rápida e já devolve bytes
+try:
+    import orjson
+
+    json_dumps = orjson.dumps
+except ImportError:
+    import json
+
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode()
+
 # Configurações
 SERVIDOR_HOST = 'localhost'
 SERVIDOR_PORT = 8000
 INTERVALO_ENVIO = 3  
 
+# Os sensores enviam em paralelo; serializa as mensagens no terminal
+saida_lock = threading.Lock()
+
+def exibir(mensagem):
+    """print() protegido para não misturar linhas de threads diferentes"""
+    with saida_lock:
+        print(mensagem)
+
 class SimuladorSensor:
     """Simula um nó sensor LoRa"""
     
@@ -21,16 +42,19 @@ class SimuladorSensor:
         self.sensor_id = sensor_id
         self.temp_base = temp_base
         self.umid_base = umid_base
+        self.conn = None  # conexão persistente (keep-alive), aberta sob demanda
+        # Gerador próprio: cada sensor roda na sua thread do pool
+        self.rng = random.Random()
         print(f"✓ Sensor {sensor_id} inicializado")
     
     def gerar_leitura(self):
         """Gera dados simulados com variação aleatória"""
 
-        temperatura = self.temp_base + random.uniform(-5, 5)
-        umidade = self.umid_base + random.uniform(-10, 10)
+        temperatura = self.temp_base + self.rng.uniform(-5, 5)
+        umidade = self.umid_base + self.rng.uniform(-10, 10)
         umidade = max(0, min(100, umidade))  # Limita entre 0-100%
         
-        poeira = random.uniform(10, 50)  # µg/m³
+        poeira = self.rng.uniform(10, 50)  # µg/m³
         
         return {
             'sensor_id': self.sensor_id,
@@ -40,44 +64,74 @@ class SimuladorSensor:
             'timestamp_sensor': datetime.now().isoformat()
         }
     
+    def conectar(self):
+        """Abre (ou reabre) a conexão persistente com o servidor"""
+        self.fechar()
+        self.conn = http.client.HTTPConnection(SERVIDOR_HOST, SERVIDOR_PORT)
+        self.conn.connect()
+
+    def fechar(self):
+        """Fecha a conexão persistente, se houver"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def conexao_caiu(self):
+        """True se o servidor encerrou a conexão enquanto o sensor esperava o próximo ciclo"""
+        # Socket ocioso que fica "legível" no select só pode ser o EOF do fechamento
+        legivel, _, _ = select.select([self.conn.sock], [], [], 0)
+        return bool(legivel)
+
+    def postar(self, payload):
+        """Envia o POST pela conexão persistente e devolve (status, corpo da resposta)"""
+        # Sem reenvio: se a leitura falhar, enviar_dados avisa e o próximo ciclo
+        # já manda uma leitura nova
+        if self.conn is None or self.conexao_caiu():
+            self.conectar()
+
+        # Cabeçalhos HTTP
+        headers = {
+            'Content-Type': 'application/json',
+            'Content-Length': len(payload),
+            'Connection': 'keep-alive'
+        }
+
+        # Envia requisição POST
+        self.conn.request('POST', '/api/sensor', payload, headers)
+
+        # Recebe resposta
+        resposta = self.conn.getresponse()
+        corpo_resposta = resposta.read().decode()
+
+        if resposta.will_close:
+            self.fechar()
+        return resposta.status, corpo_resposta
+
     def enviar_dados(self, dados):
         """Envia dados via HTTP POST para o servidor"""
         try:
-            conn = http.client.HTTPConnection(SERVIDOR_HOST, SERVIDOR_PORT)
-            
-            payload = json.dumps(dados)
-            
-            # Cabeçalhos HTTP
-            headers = {
-                'Content-Type': 'application/json',
-                'Content-Length': len(payload)
-            }
-            
-            # Envia requisição POST
-            conn.request('POST', '/api/sensor', payload, headers)
-            
-            # Recebe resposta
-            resposta = conn.getresponse()
-            corpo_resposta = resposta.read().decode()
-            
-            if resposta.status == 200:
-                print(f"✓ [{self.sensor_id}] Dados enviados: "
+            payload = json_dumps(dados)
+
+            status, corpo_resposta = self.postar(payload)
+
+            if status == 200:
+                exibir(f"✓ [{self.sensor_id}] Dados enviados: "
                       f"T={dados['temperatura']}°C, "
                       f"U={dados['umidade']}%, "
                       f"P={dados['poeira']}µg/m³")
                 return True
             else:
-                print(f"✗ [{self.sensor_id}] Erro {resposta.status}: {corpo_resposta}")
+                exibir(f"✗ [{self.sensor_id}] Erro {status}: {corpo_resposta}")
                 return False
-            
+
         except ConnectionRefusedError:
-            print(f"✗ [{self.sensor_id}] Servidor não acessível em {SERVIDOR_HOST}:{SERVIDOR_PORT}")
+            self.fechar()
+            exibir(f"✗ [{self.sensor_id}] Servidor não acessível em {SERVIDOR_HOST}:{SERVIDOR_PORT}")
             return False
         except Exception as e:
-            print(f"✗ [{self.sensor_id}] Erro ao enviar: {str(e)}")
+            self.fechar()
+            exibir(f"✗ [{self.sensor_id}] Erro ao enviar: {str(e)}")
             return False
-        finally:
-            conn.close()
 
 def simular_multiplos_sensores():
     """Simula múltiplos sensores enviando dados"""
@@ -100,23 +154,28 @@ def simular_multiplos_sensores():
     print()
     
     contador = 0
+
+    # Uma thread por sensor: cada um usa a própria conexão persistente
+    pool = ThreadPoolExecutor(max_workers=len(sensores))
     
     try:
         while True:
             contador += 1
             print(f"\n--- Ciclo {contador} ---")
             
-            # Cada sensor gera e envia uma leitura
-            for sensor in sensores:
-                leitura = sensor.gerar_leitura()
-                sensor.enviar_dados(leitura)
-                time.sleep(0.5)  # Pequeno delay entre sensores
+            # Cada sensor gera e envia uma leitura, todos em paralelo
+            envios = [pool.submit(sensor.enviar_dados, sensor.gerar_leitura())
+                      for sensor in sensores]
+            wait(envios)
             
             # Aguarda antes do próximo ciclo
             print(f"\n Aguardando {INTERVALO_ENVIO}s até próximo envio...")
             time.sleep(INTERVALO_ENVIO)
             
     except KeyboardInterrupt:
+        pool.shutdown(wait=True)
+        for sensor in sensores:
+            sensor.fechar()
         print("\n\n Simulador encerrado")
         print(f" Total de ciclos executados: {contador}")
 